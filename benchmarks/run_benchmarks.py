@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import itertools
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import numpy as np
+
+from models.SIR import SIRSimulation
+from models.planner import run_requests
+from models.instrumentation import Instrumentation
+from visualization.plot_percolation_probability import percolation_probability_requests
+from visualization.plot_critical_density import critical_density_requests
+from visualization.plot_distance_evolution import distance_evolution_requests
+from visualization.plot_propagation_velocity import propagation_velocity_requests
+from visualization.plot_epidemic_curves import epidemic_curves_requests
+from visualization.plot_secondary_infections import secondary_infections_requests
+from visualization.plot_sars_comparison import sars_comparison_requests
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results", "latest.json")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+N_VALUES = [150, 300, 600, 900, 2000]
+LAMBDA_VALUES = [0.0, 0.2]
+MODEL_TYPES = ['strong_infectiousness', 'hub']
+GAMMA_VALUES = [1.0, 0.5]
+QUICK_N_VALUES = [150, 900]
+# Relative slowdown over the baseline that fails a case, per case kind; imports
+# time disk and interpreter state, so they are noisier than compute cases
+DEFAULT_TOLERANCES = {'engine': 0.2, 'figure': 0.2, 'import': 0.5}
+# Cases whose baseline is faster than this are reported but never fail, as
+# timer and scheduling noise dominates them
+MIN_SECONDS = 0.05
+
+# Figure name -> simulations its compute phase needs
+FIGURES = {
+    'percolation_probability': percolation_probability_requests,
+    'critical_density': critical_density_requests,
+    'distance_evolution': distance_evolution_requests,
+    'propagation_velocity': propagation_velocity_requests,
+    'epidemic_curves': epidemic_curves_requests,
+    'secondary_infections': secondary_infections_requests,
+    'sars_comparison': sars_comparison_requests,
+}
+
+# Modules timed on import, and whether they must stay free of the rendering dependencies
+IMPORTS = {
+    'models.SIR': True,
+    'models.runner': True,
+    'models.planner': True,
+    'models.critical': True,
+    'visualization.run': False,
+}
+RENDERING_DEPENDENCIES = ('matplotlib', 'scipy', 'tqdm', 'pandas')
+IMPORT_SCRIPT = """
+import sys, time, json
+sys.path.append({src!r})
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+loaded = sorted({{name.split('.')[0] for name in sys.modules}} & set({dependencies!r}))
+print(json.dumps({{'seconds': seconds, 'loaded': loaded}}))
+"""
+
+
+def measure(function, repeat: int):
+    """Best wall time over `repeat` calls, then peak traced memory of one more call
+
+    Timing and memory are measured separately because tracing allocations
+    slows Python code down.
+
+    Returns:
+        tuple: (seconds, peak bytes, return value of the last timed call)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak, value
+
+
+def engine_cases(N_values, n_sims: int, engine: str, repeat: int):
+    """Time `run_simulation` over the grid of N, λ, model type and gamma
+
+    Returns:
+        dict: {case name: metrics}
+    """
+    cases = {}
+    for gamma, model_type, lambda_val, N in itertools.product(GAMMA_VALUES, MODEL_TYPES, LAMBDA_VALUES, N_values):
+        sim = SIRSimulation(gamma=gamma)
+
+        def run():
+            instrumentation = Instrumentation()
+            rng = np.random.default_rng(0)
+            for _ in range(n_sims):
+                sim.run_simulation(N, lambda_val, model_type, engine=engine, rng=rng,
+                                   instrumentation=instrumentation)
+            return instrumentation
+
+        seconds, peak, instrumentation = measure(run, repeat)
+        pairs = instrumentation.counters['pairs_evaluated']
+        name = f"engine/{engine}/{model_type}/N{N}/lambda{lambda_val:g}/gamma{gamma:g}"
+        cases[name] = {
+            'seconds': seconds,
+            'sims_per_sec': n_sims / seconds,
+            'pairs_per_sec': pairs / seconds,
+            'peak_bytes': peak,
+            **instrumentation.to_dict(),
+        }
+        print(f"{name:60s} {n_sims / seconds:10.1f} sims/s {pairs / seconds:14.0f} pairs/s {peak / 2**20:8.1f} MiB")
+    return cases
+
+
+def figure_cases(n_runs: int, repeat: int):
+    """Time the compute phase of every figure, with `n_runs` runs per scenario and no cache
+
+    Returns:
+        dict: {case name: metrics}
+    """
+    cases = {}
+    for figure, figure_requests in FIGURES.items():
+        requests = [(sim, scenario._replace(n_runs=n_runs), observables)
+                    for sim, scenario, observables in figure_requests()]
+
+        def run():
+            instrumentation = Instrumentation()
+            run_requests(requests, n_workers=1, instrumentation=instrumentation)
+            return instrumentation
+
+        seconds, peak, instrumentation = measure(run, repeat)
+        name = f"figure/{figure}"
+        cases[name] = {
+            'seconds': seconds,
+            'sims_per_sec': instrumentation.counters['runs'] / seconds,
+            'peak_bytes': peak,
+            **instrumentation.to_dict(),
+        }
+        print(f"{name:60s} {seconds:10.2f} s {peak / 2**20:8.1f} MiB")
+    return cases
+
+
+def import_cases(repeat: int):
+    """Time importing each module of IMPORTS in a fresh interpreter
+
+    Returns:
+        tuple: ({case name: metrics}, list of core modules that loaded a rendering dependency)
+    """
+    src = os.path.abspath(os.path.join(BENCHMARK_DIR, "..", "src"))
+    cases, heavy = {}, []
+    for module, core in IMPORTS.items():
+        script = IMPORT_SCRIPT.format(src=src, module=module, dependencies=RENDERING_DEPENDENCIES)
+        runs = [json.loads(subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                          check=True).stdout)
+                for _ in range(repeat)]
+        seconds = min(run['seconds'] for run in runs)
+        loaded = runs[0]['loaded']
+        name = f"import/{module}"
+        cases[name] = {'seconds': seconds, 'loaded': loaded}
+        print(f"{name:60s} {seconds * 1000:10.1f} ms {', '.join(loaded)}")
+        if core and loaded:
+            heavy.append(module)
+    return cases, heavy
+
+
+def compare(results: dict, baseline: dict, tolerances: dict = None, min_seconds: float = MIN_SECONDS):
+    """Cases slower than in the baseline by more than the tolerance of their kind
+
+    Args:
+        results (dict): Results of this run
+        baseline (dict): Results to compare against
+        tolerances (dict): {case kind: relative slowdown}, the kind being the
+            first part of the case name; DEFAULT_TOLERANCES if None
+        min_seconds (float): Cases whose baseline is faster are not checked
+
+    Returns:
+        list: (case name, baseline seconds, seconds) of the regressions
+    """
+    tolerances = DEFAULT_TOLERANCES if tolerances is None else tolerances
+    regressions = []
+    for name, metrics in results['cases'].items():
+        reference = baseline['cases'].get(name)
+        if reference is None:
+            continue
+        tolerance = tolerances[name.split('/', 1)[0]]
+        ratio = metrics['seconds'] / reference['seconds']
+        if reference['seconds'] < min_seconds:
+            flag = "too short"
+        else:
+            flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:60s} {reference['seconds']:9.3f} s -> {metrics['seconds']:9.3f} s ({ratio:5.2f}x) {flag}")
+        if flag == "REGRESSION":
+            regressions.append((name, reference['seconds'], metrics['seconds']))
+    return regressions
+
+
+def main(engine='cell_list', n_sims=20, n_runs=20, repeat=3, quick=False, figures=True, output=DEFAULT_OUTPUT,
+         baseline=DEFAULT_BASELINE, save_baseline=False, tolerance=0.2, import_tolerance=0.5,
+         min_seconds=MIN_SECONDS):
+    results = {
+        'metadata': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.platform(),
+            'engine': engine,
+            'n_sims': n_sims,
+            'n_runs': n_runs,
+        },
+        'cases': engine_cases(QUICK_N_VALUES if quick else N_VALUES, n_sims, engine, repeat),
+    }
+    import_results, heavy = import_cases(repeat)
+    results['cases'].update(import_results)
+    if figures:
+        results['cases'].update(figure_cases(n_runs, repeat))
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if heavy:
+        print(f"Rendering dependencies imported by the core: {', '.join(heavy)}")
+        return 1
+    if save_baseline:
+        with open(baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {baseline}")
+        return 0
+    if not os.path.exists(baseline):
+        print(f"No baseline at {baseline}, nothing to compare")
+        return 0
+    with open(baseline) as f:
+        tolerances = {'engine': tolerance, 'figure': tolerance, 'import': import_tolerance}
+        regressions = compare(results, json.load(f), tolerances, min_seconds)
+    if regressions:
+        print(f"{len(regressions)} case(s) slowed down by more than their tolerance")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the simulation engine and the figure computations")
+    parser.add_argument("--engine", choices=["cell_list", "hazard", "vectorized", "reference"], default="cell_list",
+                        help="Engine of run_simulation to time")
+    parser.add_argument("--sims", type=int, default=20, help="Simulations per engine case")
+    parser.add_argument("--runs", type=int, default=20, help="Runs per scenario in the figure cases")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions per case, the best one is kept")
+    parser.add_argument("--quick", action="store_true", help="Only time N = 150 and 900 in the engine cases")
+    parser.add_argument("--no-figures", action="store_true", help="Skip the figure cases")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON file the results are written to")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative slowdown of an engine or figure case over the baseline that fails the run")
+    parser.add_argument("--import-tolerance", type=float, default=0.5,
+                        help="Relative slowdown of an import case over the baseline that fails the run")
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS,
+                        help="Cases whose baseline time is below this are reported but never fail")
+    args = parser.parse_args()
+    sys.exit(main(args.engine, args.sims, args.runs, args.repeat, args.quick, not args.no_figures, args.output,
+                  args.baseline, args.save_baseline, args.tolerance, args.import_tolerance, args.min_seconds))
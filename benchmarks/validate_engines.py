@@ -0,0 +1,181 @@
+import os
+import sys
+import argparse
+import itertools
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import numpy as np
+
+from models.SIR import SIRSimulation
+from models.runner import Scenario, run_observables
+from models.checkpoint import SweepCheckpoint
+from models.observables import EPIDEMIC_CURVE, FRONT_VELOCITY, SECONDARY_HISTOGRAM
+
+MODEL_TYPES = ['strong_infectiousness', 'hub']
+GAMMA_VALUES = [1.0, 0.5]
+LAMBDA_VAL = 0.2
+# Allowed difference of two means, in standard errors of the difference; the
+# statistical checks make a dozen comparisons, so a false alarm stays rare
+Z_MAX = 4.0
+
+
+def _statistics(sim, N, model_type, engine, n_runs, seed):
+    """Final size, farthest front and major outbreak indicator of `n_runs` runs"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(n_runs):
+        result = sim.run_simulation(N, LAMBDA_VAL, model_type, engine=engine, rng=rng)
+        final_size = np.count_nonzero(result['states'])
+        rows.append((final_size, result['max_distances'].max(), final_size > N / 2))
+    return np.array(rows, dtype=float).T
+
+
+def hazard_vs_reference(N: int, n_runs: int, seed: int = 0):
+    """Compare the hazard engine to the per-pair reference in distribution
+
+    Both engines run `n_runs` independent epidemics per model and recovery
+    probability. The mean final size, mean farthest front distance and
+    major outbreak fraction must agree within Z_MAX standard errors.
+
+    Returns:
+        list: Descriptions of the failed comparisons
+    """
+    failures = []
+    names = ('final size', 'front distance', 'major outbreaks')
+    for model_type, gamma in itertools.product(MODEL_TYPES, GAMMA_VALUES):
+        sim = SIRSimulation(gamma=gamma)
+        hazard = _statistics(sim, N, model_type, 'hazard', n_runs, seed)
+        reference = _statistics(sim, N, model_type, 'reference', n_runs, seed + 1)
+        for name, a, b in zip(names, hazard, reference):
+            error = np.sqrt(a.var(ddof=1) / len(a) + b.var(ddof=1) / len(b))
+            z = abs(a.mean() - b.mean()) / error if error > 0 else 0.0
+            case = f"hazard/{model_type}/gamma{gamma:g}/{name}"
+            print(f"{case:60s} {a.mean():10.3f} vs {b.mean():10.3f} ({z:4.1f} SE)")
+            if z > Z_MAX:
+                failures.append(case)
+    return failures
+
+
+def _same(a, b):
+    return all(np.array_equal(a[name], b[name]) for name in a.keys()) and a.keys() == b.keys()
+
+
+def infector_cache(N: int, n_runs: int, seed: int = 0):
+    """Check that the infector cache leaves run_simulation bit-identical
+
+    Returns:
+        list: Descriptions of the cases whose results differ
+    """
+    failures = []
+    sim = SIRSimulation(gamma=0.5)
+    for engine, model_type in itertools.product(['cell_list', 'hazard'], MODEL_TYPES):
+        cached, uncached = np.random.default_rng(seed), np.random.default_rng(seed)
+        same = all(_same(sim.run_simulation(N, LAMBDA_VAL, model_type, engine=engine, rng=cached),
+                         sim.run_simulation(N, LAMBDA_VAL, model_type, engine=engine, rng=uncached, cache_pairs=0))
+                   for _ in range(n_runs))
+        case = f"cache/{engine}/{model_type}"
+        print(f"{case:60s} {'identical' if same else 'DIFFERENT'}")
+        if not same:
+            failures.append(case)
+    return failures
+
+
+def iter_steps_vs_run_simulation(N: int, n_runs: int, seed: int = 0):
+    """Check that the snapshots of iter_steps replay run_simulation exactly
+
+    The new infections of every step, the front after it (which
+    run_simulation records at the start of the next step) and the final
+    compartment sizes must match.
+
+    Returns:
+        list: Descriptions of the cases whose results differ
+    """
+    failures = []
+    sim = SIRSimulation(gamma=0.5)
+    for engine, model_type in itertools.product(['cell_list', 'hazard'], MODEL_TYPES):
+        simulated, stepped = np.random.default_rng(seed), np.random.default_rng(seed)
+        same = True
+        for _ in range(n_runs):
+            result = sim.run_simulation(N, LAMBDA_VAL, model_type, engine=engine, rng=simulated)
+            snapshots = list(sim.iter_steps(N, LAMBDA_VAL, model_type, engine=engine, rng=stepped))
+            final = snapshots[-1]
+            same &= (len(snapshots) == result.n_steps
+                     and np.array_equal([s.new_infections for s in snapshots], result['new_infections_per_step'])
+                     and np.array_equal([s.front for s in snapshots[:-1]], result['max_distances'][1:])
+                     and (final.susceptible, final.infected, final.recovered)
+                     == tuple(np.bincount(result['states'], minlength=3)))
+        case = f"iter_steps/{engine}/{model_type}"
+        print(f"{case:60s} {'identical' if same else 'DIFFERENT'}")
+        if not same:
+            failures.append(case)
+    return failures
+
+
+class _CrashingCheckpoint(SweepCheckpoint):
+    """Checkpoint that raises after a number of updates, like a killed sweep"""
+
+    def __init__(self, directory: str, crash_after: int):
+        super().__init__(directory, interval=0)
+        self.remaining = crash_after
+
+    def update(self, key: str, n_done: int, accumulators: dict):
+        super().update(key, n_done, accumulators)
+        self.remaining -= 1
+        if self.remaining == 0:
+            raise KeyboardInterrupt
+
+
+def checkpoint_resume(N: int, n_runs: int, seed: int = 0):
+    """Check that a sweep resumed after repeated crashes matches an uninterrupted one
+
+    Returns:
+        list: Descriptions of the cases whose results differ
+    """
+    failures = []
+    sim = SIRSimulation()
+    requests = [(Scenario(N, lambda_val, model_type, n_runs), [EPIDEMIC_CURVE, SECONDARY_HISTOGRAM, FRONT_VELOCITY])
+                for model_type in MODEL_TYPES for lambda_val in (0.0, LAMBDA_VAL)]
+    for engine in ['ensemble', 'graph']:
+        expected = run_observables(sim, requests, seed, n_workers=1, chunk_size=10, engine=engine)
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(3):
+                try:
+                    run_observables(sim, requests, seed, n_workers=1, chunk_size=10, engine=engine,
+                                    checkpoint=_CrashingCheckpoint(directory, crash_after=3))
+                except KeyboardInterrupt:
+                    pass
+            resumed = run_observables(sim, requests, seed, n_workers=1, chunk_size=10, engine=engine,
+                                      checkpoint=SweepCheckpoint(directory, interval=0))
+        same = all(np.array_equal(a[observable][field], b[observable][field])
+                   for a, b in zip(expected, resumed) for observable in a for field in a[observable])
+        case = f"checkpoint/{engine}"
+        print(f"{case:60s} {'identical' if same else 'DIFFERENT'}")
+        if not same:
+            failures.append(case)
+    return failures
+
+
+def main(N=300, n_runs=200, seed=0, statistical=True):
+    failures = (infector_cache(N, 20, seed) + iter_steps_vs_run_simulation(N, 20, seed)
+                + checkpoint_resume(N, 60, seed))
+    if statistical:
+        failures += hazard_vs_reference(N, n_runs, seed)
+    if failures:
+        print(f"{len(failures)} check(s) failed: {', '.join(failures)}")
+        return 1
+    print("All checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the engines against each other and the bit-identity "
+                                                 "of the cache, the step iterator and checkpoint resume")
+    parser.add_argument("--N", type=int, default=300, help="Number of individuals")
+    parser.add_argument("--runs", type=int, default=200,
+                        help="Runs per engine, model and recovery probability in the hazard/reference comparison")
+    parser.add_argument("--seed", type=int, default=0, help="Root seed")
+    parser.add_argument("--quick", action="store_true", help="Only run the bit-identity checks")
+    args = parser.parse_args()
+    sys.exit(main(args.N, args.runs, args.seed, not args.quick))
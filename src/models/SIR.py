@@ -3,32 +3,123 @@ import sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from typing import NamedTuple
+
 import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
-from collections import defaultdict
-from scipy.interpolate import interp1d
-import random
+from models.cell_list import PeriodicCellList
+from models.front import FrontTracker
+from models.kernels import HubKernel, StrongInfectiousnessKernel
+from models.contact_graph import ContactGraph
+from models.neighbor_cache import InfectorCache
+from models.instrumentation import phase
+
+# Bump whenever a change alters the results (or random stream) of run_ensemble,
+# or the fields of the cached summaries computed from them, so cached results
+# computed by an older engine are not reused
+ENGINE_VERSION = "ensemble-3"
+# Same for run_coupled
+GRAPH_ENGINE_VERSION = "graph-2"
+
+# Fields of SimulationResult that run_simulation can be asked for
+RESULT_FIELDS = ('positions', 'is_superspreader', 'states', 'infection_times', 'infection_tree',
+                 'secondary_infections', 'new_infections_per_step', 'max_distances', 'front_quantiles')
+
+
+class SimulationResult:
+    """Result of a single `SIRSimulation.run_simulation`
+    
+    Fields that were not requested are None. Fields can also be read as
+    result['name'], like the dict older versions returned; reading a field
+    that was not requested raises KeyError.
+    
+    Attributes:
+        n_steps (int): Number of steps the epidemic ran
+        positions (np.ndarray): (N, 2) coordinates
+        is_superspreader (np.ndarray): (N,) superspreader flags
+        states (np.ndarray): (N,) int8 final states, 0=S, 1=I, 2=R
+        infection_times (np.ndarray): (N,) int32 infection step, -1 if never infected
+        infection_tree (np.ndarray): (N,) int32 index of each individual's infector,
+            -1 for patient zero and the never infected
+        secondary_infections (np.ndarray): (N,) int32 secondary infections caused by each individual
+        new_infections_per_step (np.ndarray): (n_steps,) new infections per step
+        max_distances (np.ndarray): (n_steps,) front distance from the origin per step
+        front_quantiles (np.ndarray): (n_steps, ...) front quantiles per step, if requested
+    """
+    __slots__ = ('n_steps',) + RESULT_FIELDS
+    
+    def __init__(self, n_steps, **fields):
+        self.n_steps = n_steps
+        for name in RESULT_FIELDS:
+            setattr(self, name, fields.get(name))
+    
+    def keys(self):
+        """Names of the fields that were produced"""
+        return [name for name in RESULT_FIELDS if getattr(self, name) is not None]
+    
+    def __contains__(self, name):
+        return name in RESULT_FIELDS and getattr(self, name) is not None
+    
+    def __getitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        return getattr(self, name)
+    
+    def __getstate__(self):
+        # Fields that were not requested are left out, keeping pickles small
+        return {name: value for name in self.__slots__ if (value := getattr(self, name)) is not None}
+    
+    def __setstate__(self, state):
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+
+
+class StepSnapshot(NamedTuple):
+    """State of a simulation after one step, yielded by `SIRSimulation.iter_steps`
+    
+    Attributes:
+        step (int): Index of the step, from 0
+        new_infections (int): Individuals infected during the step
+        front (float): Largest distance from the origin of the individuals ever
+            infected, after the step
+        susceptible (int): Susceptible individuals after the step
+        infected (int): Infected individuals after the step
+        recovered (int): Recovered individuals after the step
+        targets (np.ndarray): Individuals infected during the step, if edges were requested
+        sources (np.ndarray): Infector of each target, if edges were requested
+    """
+    step: int
+    new_infections: int
+    front: float
+    susceptible: int
+    infected: int
+    recovered: int
+    targets: np.ndarray = None
+    sources: np.ndarray = None
 
 class SIRSimulation:
-    def __init__(self, r0:float =1, w0: float =1, gamma: float =1, alpha: float =2):
+    def __init__(self, r0:float =1, w0: float =1, gamma: float =1, alpha: float =2, L: float =None):
         """Initializes parameters for a spatially structured SIR model simulation
     
         Parameters: 
         
             r0 (float): Infection cutoff distance for normal individuals.
-            L (float): Simulation space size (10 * r0)
+            L (float): Simulation space size, 10 * r0 if None
             w0 (float): Base infection probability scaling factor.
             gamma (float): Recovery probability.
             alpha (float): Exponent for distance-dependent infection probability.
             rs (float): Superspreader cutoff distance (sqrt(6) * r0) for hub model
         """
         self.r0 = r0
-        self.L = 10 * r0
+        self.L = 10 * r0 if L is None else L
         self.w0 = w0
         self.gamma = gamma
         self.alpha = alpha
         self.rs = np.sqrt(6) * r0
+        # Array kernels of both models, built once
+        self.kernels = {
+            'strong_infectiousness': StrongInfectiousnessKernel(w0, r0, alpha),
+            'hub': HubKernel(w0, r0, self.rs, alpha),
+        }
         
     def periodic_distance(self, x1: float, y1: float, x2: float, y2: float):
         """Calculate periodic distance with boundary conditions
@@ -47,6 +138,60 @@ class SIRSimulation:
         dx = min(dx, self.L - dx)
         dy = min(dy, self.L - dy)
         return np.sqrt(dx**2 + dy**2)
+
+    def periodic_distances(self, point: np.ndarray, points: np.ndarray):
+        """Calculate periodic distances from one point to many points
+        
+        Args: 
+            point (np.ndarray): Coordinates of the reference point, shape (2,)
+            points (np.ndarray): Coordinates of the other points, shape (M, 2)
+            
+        Returns: 
+            np.ndarray: Euclidean distances considering periodic boundaries of size L.
+        """
+        d = np.abs(points - point)
+        d = np.minimum(d, self.L - d)
+        return np.sqrt(d[:, 0]**2 + d[:, 1]**2)
+
+    def periodic_squared_distances(self, point: np.ndarray, points: np.ndarray):
+        """Squared periodic distances from one point (or one point per row) to many points
+        
+        Args: 
+            point (np.ndarray): Coordinates of the reference point(s), broadcast against `points`
+            points (np.ndarray): Coordinates of the other points, shape (..., 2)
+            
+        Returns: 
+            np.ndarray: Squared Euclidean distances considering periodic boundaries of size L.
+        """
+        d = np.abs(points - point)
+        d = np.minimum(d, self.L - d)
+        return d[..., 0]**2 + d[..., 1]**2
+
+    def kernel(self, model_type: str):
+        """Array kernel of a model, see `models.kernels`
+        
+        Args: 
+            model_type (str): Type of model, "hub" or "strong_infectiousness"
+        
+        Returns: 
+            InfectionKernel: Kernel taking squared distances and superspreader masks
+        """
+        try:
+            return self.kernels[model_type]
+        except KeyError:
+            raise ValueError(f"Unknown model type: {model_type}") from None
+
+    def interaction_cutoff(self, model_type: str, is_superspreader: bool):
+        """Distance beyond which an individual cannot infect anyone
+        
+        Args: 
+            model_type (str): Type of model, "hub" or "strong_infectiousness"
+            is_superspreader (bool): True if the individual is a superspreader
+        
+        Returns: 
+            float: Cutoff distance (rs for hub superspreaders, r0 otherwise)
+        """
+        return self.kernel(model_type).cutoff(is_superspreader)
         
     def infection_probability(self, r: float , is_superspreader: bool, model_type: str ="hub"): 
         """Calculate infection probability
@@ -66,109 +211,759 @@ class SIRSimulation:
             if is_superspreader:
                 return self.w0 
             else:
-                return self.w0 * (1 - r/self.r0)**2
+                return self.w0 * (1 - r/self.r0)**self.alpha
         
         # Hub model
         elif model_type == "hub":
             if is_superspreader:
                 if r > self.rs:
                     return 0
-                return self.w0 * (1 - r/self.rs)**2
+                return self.w0 * (1 - r/self.rs)**self.alpha
             else:
                 if r > self.r0:
                     return 0
-                return self.w0 * (1 - r/self.r0)**2
-    
-    def run_simulation(self, N, lambda_val, model_type='strong_infectiousness', max_steps=100, initial_pos=(0, 0)):
-        """Run a single epidemic simulation
+                return self.w0 * (1 - r/self.r0)**self.alpha
+
+    def infection_probabilities(self, r: np.ndarray, is_superspreader: np.ndarray, model_type: str ="hub"):
+        """Calculate infection probabilities for arrays of pairs
+        
+        Array version of `infection_probability`; `r` and `is_superspreader`
+        are broadcast against each other. Callers holding squared distances
+        should use `kernel(model_type)` directly.
         
         Args: 
-            N (int): Number of individuals
-            lambda_val (float): Fraction of superspreaders
-            model_type (str): Type of model "hub" or "strong_infectiousness" 
-            max_steps (int): Maximum simulation steps
-            initial_pos (tuple): Initial infected position
+            r (np.ndarray): Distances between infectors and targets
+            is_superspreader (np.ndarray): True where the infector is a superspreader
+            model_type (str): Type of model, "hub" or "strong_infectiousness"
+        
+        Returns: 
+            np.ndarray: Infection probabilities
+        """
+        return self.kernel(model_type)(np.square(r), is_superspreader)
+    
+    def _infect_reference(self, positions, is_superspreader, states, model_type, infected_indices, rng,
+                          instrumentation=None):
+        """Infection process checking every individual for every infector
+        
+        Returns: 
+            tuple: (targets, sources) arrays of the individuals infected in this
+                step and of their infectors
+        """
+        N = len(states)
+        targets, sources = [], []
+        for infector_idx in infected_indices:
+            infector_pos = positions[infector_idx]
+            infector_superspreader = is_superspreader[infector_idx]
             
+            for target_idx in range(N):
+                if states[target_idx] == 0:  # Susceptible
+                    target_pos = positions[target_idx]
+                    distance = self.periodic_distance(
+                        infector_pos[0], infector_pos[1],
+                        target_pos[0], target_pos[1]
+                    )
+                    
+                    # Calculate infection probability
+                    if model_type == 'strong_infectiousness':
+                        prob = self.infection_probability(distance, infector_superspreader, model_type="strong_infectiousness")
+                    else:  # hub
+                        prob = self.infection_probability(distance, infector_superspreader, model_type="hub")
+                    
+                    if instrumentation is not None:
+                        instrumentation.count('pairs_evaluated')
+                        instrumentation.count('pairs_in_range', prob > 0)
+                        instrumentation.count('rng_draws')
+                    
+                    if rng.random() < prob:
+                        states[target_idx] = 1
+                        targets.append(target_idx)
+                        sources.append(infector_idx)
+        return np.array(targets, dtype=int), np.array(sources, dtype=int)
+
+    def _infect_cell_list(self, cell_list, positions, is_superspreader, states, model_type, infected_indices, rng,
+                          cache=None, instrumentation=None):
+        """Infection process restricted to the cells around each infector
+        
+        Pairs beyond the cutoff have zero infection probability, so skipping them
+        leaves the statistics of the reference loop unchanged. The in-range
+        neighbors of all infectors not cached are evaluated in one kernel call
+        at the start of the step; each infector then draws for those of its
+        targets still susceptible at its turn, so the random draws are those of
+        the reference loop restricted to in-range pairs. With an InfectorCache,
+        an infector's in-range neighbors and probabilities are computed on its
+        first infectious step only; the cached targets keep their order, so the
+        random draws are the same as without the cache.
+        
+        Returns: 
+            tuple: (targets, sources) arrays of the individuals infected in this
+                step and of their infectors
+        """
+        kernel = self.kernel(model_type)
+        entries = [None if cache is None else cache.get(idx, states) for idx in infected_indices]
+        
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if missing:
+            candidates = [cell_list.neighbors(infected_indices[i]) for i in missing]
+            candidates = [c[states[c] == 0] for c in candidates]
+            infectors = np.repeat(infected_indices[missing], [len(c) for c in candidates])
+            candidates = np.concatenate(candidates)
+            r2 = self.periodic_squared_distances(positions[infectors], positions[candidates])
+            cutoffs = np.where(is_superspreader[infectors], kernel.superspreader_cutoff, kernel.r0)
+            in_range = r2 <= cutoffs**2
+            probs = kernel(r2[in_range], is_superspreader[infectors[in_range]])
+            if instrumentation is not None:
+                instrumentation.count('pairs_evaluated', len(candidates))
+            bounds = np.searchsorted(infectors[in_range], infected_indices[missing], side='right')
+            for i, entry in zip(missing, zip(np.split(candidates[in_range], bounds[:-1]),
+                                             np.split(probs, bounds[:-1]))):
+                entries[i] = entry
+                if cache is not None:
+                    cache.put(infected_indices[i], *entry)
+        
+        targets, sources = [], []
+        for infector_idx, (candidates, probs) in zip(infected_indices, entries):
+            # Targets infected earlier in this step are no longer exposed
+            susceptible = states[candidates] == 0
+            candidates, probs = candidates[susceptible], probs[susceptible]
+            if instrumentation is not None:
+                instrumentation.count('pairs_in_range', len(candidates))
+                instrumentation.count('rng_draws', len(candidates))
+            hits = candidates[rng.random(len(candidates)) < probs]
+            states[hits] = 1
+            targets.append(hits)
+            sources.append(np.full(len(hits), infector_idx))
+        return np.concatenate(targets).astype(int), np.concatenate(sources).astype(int)
+
+    def _infect_hazard(self, cell_list, positions, is_superspreader, states, model_type, infected_indices, rng,
+                       cache=None, instrumentation=None):
+        """Infection process with one Bernoulli trial per exposed susceptible
+        
+        A susceptible in range of infectors with probabilities p_1..p_k (in index
+        order) escapes all of them with probability prod(1 - p_j). A single
+        uniform u decides both whether it is infected and by whom: it is
+        infected by the first infector k with u < 1 - prod_{j<=k}(1 - p_j).
+        Conditionally on infection, u is uniform below the combined probability,
+        so the infector follows the first-success distribution of the per-pair
+        trials, p_k prod_{j<k}(1 - p_j) / (1 - prod_j(1 - p_j)), and the infection
+        tree has the same law as with the per-pair engines. The cache is used as
+        in `_infect_cell_list`.
+        
         Returns: 
-            dict: Simulation results including positions, states, infection tree, and metrics
+            tuple: (targets, sources) arrays of the individuals infected in this
+                step and of their infectors
+        """
+        entries = [None if cache is None else cache.get(idx, states) for idx in infected_indices]
+        
+        # Probabilities of the infectors not cached are evaluated in one kernel call
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if missing:
+            candidates = [cell_list.neighbors(infected_indices[i]) for i in missing]
+            candidates = [c[states[c] == 0] for c in candidates]
+            infectors = np.repeat(infected_indices[missing], [len(c) for c in candidates])
+            candidates = np.concatenate(candidates)
+            r2 = self.periodic_squared_distances(positions[infectors], positions[candidates])
+            probs = self.kernel(model_type)(r2, is_superspreader[infectors])
+            in_range = probs > 0
+            if instrumentation is not None:
+                instrumentation.count('pairs_evaluated', len(candidates))
+            bounds = np.searchsorted(infectors[in_range], infected_indices[missing], side='right')
+            for i, entry in zip(missing, zip(np.split(candidates[in_range], bounds[:-1]),
+                                             np.split(probs[in_range], bounds[:-1]))):
+                entries[i] = entry
+                if cache is not None:
+                    cache.put(infected_indices[i], *entry)
+        
+        counts = [len(entry[0]) for entry in entries]
+        if instrumentation is not None:
+            instrumentation.count('pairs_in_range', sum(counts))
+        if sum(counts) == 0:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        pair_sources = np.repeat(infected_indices, counts)
+        pair_targets = np.concatenate([entry[0] for entry in entries])
+        pair_probs = np.concatenate([entry[1] for entry in entries])
+        
+        # Group the pairs by target, infectors in index order within a group
+        order = np.argsort(pair_targets, kind='stable')
+        pair_targets, pair_sources, pair_probs = pair_targets[order], pair_sources[order], pair_probs[order]
+        exposed, group_start, group_size = np.unique(pair_targets, return_index=True, return_counts=True)
+        
+        # Cumulative log escape probability within each group; p = 1 is capped at exp(-50) escape
+        with np.errstate(divide='ignore'):
+            log_escape = np.maximum(np.log1p(-pair_probs), -50.0)
+        cumulative = np.cumsum(log_escape)
+        offsets = np.repeat(cumulative[group_start] - log_escape[group_start], group_size)
+        infected_by = 1 - np.exp(cumulative - offsets)
+        
+        u = rng.random(len(exposed))
+        if instrumentation is not None:
+            instrumentation.count('rng_draws', len(exposed))
+        hits = np.flatnonzero(u[np.repeat(np.arange(len(exposed)), group_size)] < infected_by)
+        if len(hits) == 0:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        # The first hit of each group is its infector
+        first = hits[np.concatenate(([True], pair_targets[hits[1:]] != pair_targets[hits[:-1]]))]
+        targets, sources = pair_targets[first], pair_sources[first]
+        states[targets] = 1
+        return targets, sources
+
+    def _infect_vectorized(self, positions, is_superspreader, states, model_type, infected_indices, rng,
+                           max_pairs=1 << 22, instrumentation=None):
+        """Infection process evaluating all infector-susceptible pairs as arrays
+        
+        One Bernoulli trial is drawn per pair. A target hit by several infectors
+        is attributed to the first of them in index order, as in the reference
+        loop. Infectors are processed in blocks of at most `max_pairs` pairs.
+        
+        Returns: 
+            tuple: (targets, sources) arrays of the individuals infected in this
+                step and of their infectors
+        """
+        kernel = self.kernel(model_type)
+        susceptible = np.flatnonzero(states == 0)
+        all_targets, all_sources = [], []
+        block = max(1, max_pairs // max(1, len(susceptible)))
+        
+        for start in range(0, len(infected_indices), block):
+            if len(susceptible) == 0:
+                break
+            infectors = infected_indices[start:start + block]
+            
+            r2 = self.periodic_squared_distances(positions[infectors][:, None, :], positions[susceptible][None, :, :])
+            probs = kernel(r2, is_superspreader[infectors][:, None])
+            if instrumentation is not None:
+                instrumentation.count('pairs_evaluated', probs.size)
+                instrumentation.count('pairs_in_range', np.count_nonzero(probs))
+                instrumentation.count('rng_draws', probs.size)
+            
+            hits = rng.random(probs.shape) < probs
+            hit_targets = hits.any(axis=0)
+            if not hit_targets.any():
+                continue
+            
+            targets = susceptible[hit_targets]
+            sources = infectors[hits[:, hit_targets].argmax(axis=0)]
+            
+            states[targets] = 1
+            all_targets.append(targets)
+            all_sources.append(sources)
+            
+            susceptible = susceptible[~hit_targets]
+        if not all_targets:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        return np.concatenate(all_targets), np.concatenate(all_sources)
+    
+    def _initialize(self, N, lambda_val, initial_pos, rng):
+        """Draw the positions and superspreader flags of a single run
+        
+        Returns: 
+            tuple: (positions, is_superspreader, states) with patient zero at
+                `initial_pos` and infected, everyone else susceptible
         """
         # Initialize individuals
-        positions = np.random.uniform(0, self.L, (N, 2))
+        positions = rng.uniform(0, self.L, (N, 2))
         positions[0] = initial_pos  # Patient zero
         
         # Assign superspreader status
-        is_superspreader = np.random.random(N) < lambda_val
+        is_superspreader = rng.random(N) < lambda_val
         
         # States: 0=S, 1=I, 2=R
-        states = np.zeros(N, dtype=int)
+        states = np.zeros(N, dtype=np.int8)
         states[0] = 1  # Initial infection
+        return positions, is_superspreader, states
+    
+    def _steps(self, positions, is_superspreader, states, model_type, max_steps, engine, rng, cache_pairs,
+               instrumentation=None):
+        """Advance an epidemic step by step, updating `states` in place
         
-        infection_times = np.full(N, -1)
-        infection_times[0] = 0
-        
-        # Track infection network
-        infection_tree = {}
-        secondary_infections = defaultdict(int)
+        Each step runs the infection process of `engine` and then the recovery
+        process; the generator stops once nobody is infected or after
+        `max_steps` steps.
         
-        new_infections_per_step = []
-        max_distances = []
+        Yields: 
+            tuple: (step, targets, sources, recovered) the individuals infected
+                in the step, their infectors and the individuals that recovered
+        """
+        cache = None
+        if engine in ('cell_list', 'hazard'):
+            cutoff = self.interaction_cutoff(model_type, bool(is_superspreader.any()))
+            cell_list = PeriodicCellList(positions, self.L, cutoff)
+            # Infectors only stay infectious for several steps when gamma < 1
+            cache = InfectorCache(cache_pairs) if self.gamma < 1 and cache_pairs > 0 else None
+        elif engine not in ('vectorized', 'reference'):
+            raise ValueError(f"Unknown engine: {engine}")
         
         for step in range(max_steps):
-            new_infections = 0
             infected_indices = np.where(states == 1)[0]
             
             if len(infected_indices) == 0:
                 break
-                
-            # Calculate maximum distance from origin
-            infected_positions = positions[states > 0]
-            if len(infected_positions) > 0:
-                distances = [self.periodic_distance(pos[0], pos[1], initial_pos[0], initial_pos[1]) 
-                           for pos in infected_positions]
-                max_distances.append(max(distances))
-            else:
-                max_distances.append(0)
+            if instrumentation is not None:
+                instrumentation.count('steps')
             
             # Infection process
-            for infector_idx in infected_indices:
-                infector_pos = positions[infector_idx]
-                infector_superspreader = is_superspreader[infector_idx]
-                
-                for target_idx in range(N):
-                    if states[target_idx] == 0:  # Susceptible
-                        target_pos = positions[target_idx]
-                        distance = self.periodic_distance(
-                            infector_pos[0], infector_pos[1],
-                            target_pos[0], target_pos[1]
-                        )
-                        
-                        # Calculate infection probability
-                        if model_type == 'strong_infectiousness':
-                            prob = self.infection_probability(distance, infector_superspreader, model_type="strong_infectiousness")
-                        else:  # hub
-                            prob = self.infection_probability(distance, infector_superspreader, model_type="hub")
-                        
-                        if np.random.random() < prob:
-                            states[target_idx] = 1
-                            infection_times[target_idx] = step + 1
-                            infection_tree[target_idx] = infector_idx
-                            secondary_infections[infector_idx] += 1
-                            new_infections += 1
+            with phase(instrumentation, 'infection'):
+                if engine == 'cell_list':
+                    targets, sources = self._infect_cell_list(
+                        cell_list, positions, is_superspreader, states, model_type, infected_indices, rng, cache,
+                        instrumentation
+                    )
+                elif engine == 'hazard':
+                    targets, sources = self._infect_hazard(
+                        cell_list, positions, is_superspreader, states, model_type, infected_indices, rng, cache,
+                        instrumentation
+                    )
+                elif engine == 'vectorized':
+                    targets, sources = self._infect_vectorized(
+                        positions, is_superspreader, states, model_type, infected_indices, rng,
+                        instrumentation=instrumentation
+                    )
+                else:
+                    targets, sources = self._infect_reference(
+                        positions, is_superspreader, states, model_type, infected_indices, rng, instrumentation
+                    )
             
             # Recovery process
-            for idx in infected_indices:
-                if np.random.random() < self.gamma:
-                    states[idx] = 2
+            with phase(instrumentation, 'recovery'):
+                recovered = []
+                for idx in infected_indices:
+                    if rng.random() < self.gamma:
+                        states[idx] = 2
+                        recovered.append(idx)
+                        if cache is not None:
+                            cache.evict(idx)
+                if instrumentation is not None:
+                    instrumentation.count('rng_draws', len(infected_indices))
             
-            new_infections_per_step.append(new_infections)
+            yield step, targets, sources, recovered
+    
+    def iter_steps(self, N, lambda_val, model_type='strong_infectiousness', max_steps=100, initial_pos=(0, 0),
+                   engine='cell_list', rng=None, edges=False, cache_pairs=1 << 20, instrumentation=None):
+        """Run a single epidemic simulation, yielding a snapshot after every step
         
-        return {
+        The same simulation as `run_simulation` (with the same random stream,
+        so equal seeds give equal epidemics), but nothing is kept per step: the
+        caller can stop early by leaving the loop, and memory does not grow with
+        `max_steps`.
+        
+        Args: 
+            N (int): Number of individuals
+            lambda_val (float): Fraction of superspreaders
+            model_type (str): Type of model "hub" or "strong_infectiousness" 
+            max_steps (int): Maximum simulation steps
+            initial_pos (tuple): Initial infected position
+            engine (str): Infection engine, see `run_simulation`
+            rng (np.random.Generator): Source of randomness, the global NumPy state if None
+            edges (bool): Whether snapshots carry the new infection tree edges
+            cache_pairs (int): See `run_simulation`
+            instrumentation (Instrumentation): See `run_simulation`
+        
+        Yields: 
+            StepSnapshot: State after each step
+        """
+        rng = np.random if rng is None else rng
+        if instrumentation is not None:
+            instrumentation.count('runs')
+        positions, is_superspreader, states = self._initialize(N, lambda_val, initial_pos, rng)
+        front = FrontTracker(self.periodic_distances(np.asarray(initial_pos, dtype=float), positions))
+        front.add(np.array([0]))
+        
+        susceptible, infected, recovered = N - 1, 1, 0
+        for step, targets, sources, recoveries in self._steps(positions, is_superspreader, states, model_type,
+                                                              max_steps, engine, rng, cache_pairs, instrumentation):
+            with phase(instrumentation, 'front'):
+                front.add(targets)
+            susceptible -= len(targets)
+            infected += len(targets) - len(recoveries)
+            recovered += len(recoveries)
+            yield StepSnapshot(step, len(targets), front.max, susceptible, infected, recovered,
+                               targets if edges else None, sources if edges else None)
+    
+    def run_simulation(self, N, lambda_val, model_type='strong_infectiousness', max_steps=100, initial_pos=(0, 0),
+                       engine='cell_list', rng=None, front_quantiles=None, observables=None,
+                       cache_pairs=1 << 20, instrumentation=None):
+        """Run a single epidemic simulation
+        
+        Args: 
+            N (int): Number of individuals
+            lambda_val (float): Fraction of superspreaders
+            model_type (str): Type of model "hub" or "strong_infectiousness" 
+            max_steps (int): Maximum simulation steps
+            initial_pos (tuple): Initial infected position
+            engine (str): "cell_list" only examines targets in the cells around each
+                infector; "hazard" also uses the cells but draws once per exposed
+                susceptible from its combined infection probability instead of once
+                per pair, see `_infect_hazard`; "vectorized" evaluates all
+                infector-susceptible pairs of a step as arrays; "reference" checks
+                every individual for every infector
+            rng (np.random.Generator): Source of randomness, the global NumPy state if None
+            front_quantiles (list): Optional fractions q; the result then also holds
+                'front_quantiles', per step the distance within which a fraction q of
+                the individuals ever infected lie (to within r0 / 20)
+            observables (list): Fields of SimulationResult to produce, all of them if
+                None; unselected fields are neither allocated nor returned
+            cache_pairs (int): With the "cell_list" and "hazard" engines and gamma < 1,
+                bound on the (infector, target) pairs kept across an infector's
+                infectious period, see `models.neighbor_cache.InfectorCache`; 0 disables the cache
+            instrumentation (Instrumentation): Optional counters and phase timers the
+                run adds to, see `models.instrumentation`; None disables them
+            
+        Returns: 
+            SimulationResult: Simulation results including positions, states, infection tree, and metrics
+        """
+        rng = np.random if rng is None else rng
+        observables = set(RESULT_FIELDS if observables is None else observables)
+        unknown = observables - set(RESULT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown observables: {sorted(unknown)}")
+        if 'front_quantiles' in observables and front_quantiles is None:
+            observables.discard('front_quantiles')
+        if instrumentation is not None:
+            instrumentation.count('runs')
+        
+        positions, is_superspreader, states = self._initialize(N, lambda_val, initial_pos, rng)
+        
+        infection_times = None
+        if 'infection_times' in observables:
+            infection_times = np.full(N, -1, dtype=np.int32)
+            infection_times[0] = 0
+        
+        # Track infection network: parent of each infected individual, -1 for patient zero and the uninfected
+        infection_tree = np.full(N, -1, dtype=np.int32) if 'infection_tree' in observables else None
+        secondary_infections = np.zeros(N, dtype=np.int32) if 'secondary_infections' in observables else None
+        
+        new_infections_per_step = np.zeros(max_steps, dtype=np.int32)
+        max_distances = np.zeros(max_steps)
+        quantiles = np.zeros((max_steps, *np.shape(front_quantiles))) if 'front_quantiles' in observables else None
+        n_steps = 0
+        
+        # Distances from the origin are computed once, the front is updated as individuals get infected
+        front = FrontTracker(self.periodic_distances(np.asarray(initial_pos, dtype=float), positions),
+                             None if front_quantiles is None else self.r0 / 20)
+        front.add(np.array([0]))
+        
+        for step, targets, sources, _ in self._steps(positions, is_superspreader, states, model_type, max_steps,
+                                                     engine, rng, cache_pairs, instrumentation):
+            n_steps = step + 1
+            
+            with phase(instrumentation, 'front'):
+                # Maximum distance from origin, before this step's infections
+                max_distances[step] = front.max
+                if quantiles is not None:
+                    quantiles[step] = front.quantile(front_quantiles)
+                front.add(targets)
+            
+            with phase(instrumentation, 'results'):
+                if infection_times is not None:
+                    infection_times[targets] = step + 1
+                if infection_tree is not None:
+                    infection_tree[targets] = sources
+                if secondary_infections is not None:
+                    np.add.at(secondary_infections, sources, 1)
+                new_infections_per_step[step] = len(targets)
+        
+        fields = {
             'positions': positions,
             'is_superspreader': is_superspreader,
             'states': states,
             'infection_times': infection_times,
             'infection_tree': infection_tree,
-            'secondary_infections': dict(secondary_infections),
+            'secondary_infections': secondary_infections,
+            'new_infections_per_step': new_infections_per_step[:n_steps],
+            'max_distances': max_distances[:n_steps],
+            'front_quantiles': None if quantiles is None else quantiles[:n_steps],
+        }
+        return SimulationResult(n_steps, **{name: fields[name] for name in observables})
+
+    def run_ensemble(self, N, lambda_val, model_type='strong_infectiousness', n_runs=1000, max_steps=100,
+                     initial_pos=(0, 0), max_pairs=1 << 21, rng=None, front_threshold=None, instrumentation=None):
+        """Run many independent epidemic simulations in lockstep
+        
+        All replicas share N, lambda_val and model_type and are stored as (R, N)
+        arrays, so a step of every replica is one vectorized pass. Replicas whose
+        epidemic has died out (or whose front has reached `front_threshold`) are
+        masked out of later steps.
+        
+        Args: 
+            N (int): Number of individuals
+            lambda_val (float): Fraction of superspreaders
+            model_type (str): Type of model "hub" or "strong_infectiousness" 
+            n_runs (int): Number of replicas R
+            max_steps (int): Maximum simulation steps
+            initial_pos (tuple): Initial infected position
+            max_pairs (int): Upper bound on infector-target pairs evaluated at once
+            rng (np.random.Generator): Source of randomness, the global NumPy state if None
+            front_threshold (float): Stop a replica as soon as its front distance
+                reaches this value; only `max(max_distances) >= front_threshold`
+                remains meaningful for such replicas. This is the early-stopping
+                percolation query: the runner sets it for percolation-only
+                requests, see `models.observables.stopping_threshold`
+            instrumentation (Instrumentation): Optional counters and phase timers,
+                see `run_simulation`; steps are counted per replica
+            
+        Returns: 
+            dict: Stacked results with
+                'new_infections_per_step' (R, max_steps), zero after extinction,
+                'max_distances' (R, max_steps), holding the last value after extinction,
+                'n_steps' (R,) number of steps each replica ran,
+                'secondary_infections' (R, N) secondary infections caused by each individual,
+                'is_superspreader' (R, N) and final 'states' (R, N)
+        """
+        rng = np.random if rng is None else rng
+        R = n_runs
+        if instrumentation is not None:
+            instrumentation.count('runs', R)
+        kernel = self.kernel(model_type)
+        positions = rng.uniform(0, self.L, (R, N, 2))
+        positions[:, 0] = initial_pos  # Patient zero
+        is_superspreader = rng.random((R, N)) < lambda_val
+        
+        # States: 0=S, 1=I, 2=R
+        states = np.zeros((R, N), dtype=np.int8)
+        states[:, 0] = 1
+        
+        # Distance of every individual from the origin of the epidemic
+        d = np.abs(positions - np.asarray(initial_pos, dtype=float))
+        d = np.minimum(d, self.L - d)
+        origin_distances = np.sqrt(d[..., 0]**2 + d[..., 1]**2)
+        
+        secondary_infections = np.zeros((R, N), dtype=np.int64)
+        new_infections_per_step = np.zeros((R, max_steps), dtype=np.int64)
+        max_distances = np.zeros((R, max_steps))
+        # Running front distance of each replica, raised as individuals get infected
+        front = np.zeros(R)
+        n_steps = np.zeros(R, dtype=np.int64)
+        stopped = np.zeros(R, dtype=bool)
+        
+        for step in range(max_steps):
+            infected = states == 1
+            active = np.flatnonzero(infected.any(axis=1) & ~stopped)
+            if len(active) == 0:
+                break
+            n_steps[active] += 1
+            if instrumentation is not None:
+                instrumentation.count('steps', len(active))
+            
+            # Calculate maximum distance from origin
+            max_distances[active, step] = front[active]
+            if front_threshold is not None:
+                crossed = max_distances[active, step] >= front_threshold
+                stopped[active[crossed]] = True
+                active = active[~crossed]
+            
+            # Infection process, over (replica, infector) pairs sorted by infector index
+            with phase(instrumentation, 'infection'):
+                rep_idx, infector_idx = np.nonzero(infected[active])
+                rep_idx = active[rep_idx]
+                block = max(1, max_pairs // N)
+                for start in range(0, len(rep_idx), block):
+                    reps = rep_idx[start:start + block]
+                    infectors = infector_idx[start:start + block]
+                    
+                    r2 = self.periodic_squared_distances(positions[reps, infectors][:, None, :], positions[reps])
+                    probs = kernel(r2, is_superspreader[reps, infectors][:, None])
+                    probs[states[reps] != 0] = 0
+                    
+                    # Only pairs with a nonzero probability need a random draw
+                    candidates = probs > 0
+                    if instrumentation is not None:
+                        instrumentation.count('pairs_evaluated', probs.size)
+                        instrumentation.count('pairs_in_range', np.count_nonzero(candidates))
+                        instrumentation.count('rng_draws', np.count_nonzero(candidates))
+                    hits = np.zeros_like(candidates)
+                    hits[candidates] = rng.random(np.count_nonzero(candidates)) < probs[candidates]
+                    
+                    rows, targets = np.nonzero(hits)
+                    if len(rows) == 0:
+                        continue
+                    
+                    # Attribute each target to its first successful infector
+                    _, first = np.unique(reps[rows] * N + targets, return_index=True)
+                    rows, targets = rows[first], targets[first]
+                    
+                    states[reps[rows], targets] = 1
+                    np.add.at(secondary_infections, (reps[rows], infectors[rows]), 1)
+                    np.add.at(new_infections_per_step[:, step], reps[rows], 1)
+                    np.maximum.at(front, reps[rows], origin_distances[reps[rows], targets])
+            
+            # Recovery process, one draw per individual infected at the start of the step
+            with phase(instrumentation, 'recovery'):
+                recovered = rng.random(len(rep_idx)) < self.gamma
+                states[rep_idx[recovered], infector_idx[recovered]] = 2
+                if instrumentation is not None:
+                    instrumentation.count('rng_draws', len(rep_idx))
+        
+        # Hold the final front distance after a replica has died out
+        steps = np.arange(max_steps)
+        last = np.maximum(n_steps - 1, 0)
+        max_distances = np.where(steps[None, :] < n_steps[:, None], max_distances,
+                                 max_distances[np.arange(R), last][:, None])
+        
+        return {
             'new_infections_per_step': new_infections_per_step,
-            'max_distances': max_distances
-        }
\ No newline at end of file
+            'max_distances': max_distances,
+            'n_steps': n_steps,
+            'secondary_infections': secondary_infections,
+            'is_superspreader': is_superspreader,
+            'states': states
+        }
+
+    def run_coupled(self, N, targets, n_runs=1000, max_steps=100, initial_pos=(0, 0), rng=None,
+                    front_thresholds=None, instrumentation=None):
+        """Run many epidemics on shared population draws, for several (lambda_val, model_type) targets
+        
+        Each replica samples one population, i.e. positions, a uniform u_i per
+        individual (individual i is a superspreader when u_i < lambda_val), an
+        infectious period per individual and one uniform per contact, and
+        runs every target on it as a traversal of its ContactGraph. Pairs and
+        distances are computed once per replica instead of once per target, and
+        the targets see common random numbers, which makes differences between
+        them much less noisy than with independent runs.
+        
+        The dynamics match `run_ensemble` in distribution: an infector is
+        infectious for a Geometric(gamma) number of steps and tries each
+        neighbor once per step with probability p, so the contact transmits
+        after a Geometric(p) number of attempts, drawn by inversion from the
+        contact's uniform. A target reached by several infectors in a step is
+        attributed to the first of them in index order.
+        
+        Args: 
+            N (int): Number of individuals
+            targets (list): (lambda_val, model_type) pairs to simulate
+            n_runs (int): Number of replicas R
+            max_steps (int): Maximum simulation steps
+            initial_pos (tuple): Initial infected position
+            rng (np.random.Generator): Source of randomness, the global NumPy state if None
+            front_thresholds (list): Optional front_threshold per target, see `run_ensemble`
+            instrumentation (Instrumentation): Optional counters and phase timers, see
+                `run_simulation`; every (replica, target) epidemic counts as a run
+            
+        Returns: 
+            list: One dict per target, with the same fields as `run_ensemble`
+        """
+        rng = np.random if rng is None else rng
+        R = n_runs
+        front_thresholds = [None] * len(targets) if front_thresholds is None else front_thresholds
+        cutoff = max(kernel.max_cutoff for kernel in self.kernels.values())
+        
+        results = [{
+            'new_infections_per_step': np.zeros((R, max_steps), dtype=np.int64),
+            'max_distances': np.zeros((R, max_steps)),
+            'n_steps': np.zeros(R, dtype=np.int64),
+            'secondary_infections': np.zeros((R, N), dtype=np.int64),
+            'is_superspreader': np.zeros((R, N), dtype=bool),
+            'states': np.zeros((R, N), dtype=np.int8),
+        } for _ in targets]
+        
+        for run_idx in range(R):
+            positions = rng.uniform(0, self.L, (N, 2))
+            positions[0] = initial_pos  # Patient zero
+            superspreader_draws = rng.random(N)
+            if self.gamma > 0:
+                infectious_periods = rng.geometric(self.gamma, N)
+            else:
+                infectious_periods = np.full(N, max_steps + 1)  # Nobody recovers within the run
+            graph = ContactGraph(positions, self.L, cutoff)
+            contact_draws = 1 - rng.random(graph.n_edges)  # in (0, 1]
+            if instrumentation is not None:
+                instrumentation.count('rng_draws', graph.n_edges + N)
+            origin_distances = np.sqrt(self.periodic_squared_distances(np.asarray(initial_pos, dtype=float),
+                                                                       positions))
+            
+            for (lambda_val, model_type), threshold, result in zip(targets, front_thresholds, results):
+                is_superspreader = superspreader_draws < lambda_val
+                with phase(instrumentation, 'infection'):
+                    infection_times, parents, n_steps = self._traverse(
+                        graph, contact_draws, infectious_periods, is_superspreader, self.kernel(model_type),
+                        max_steps, origin_distances, threshold, result['max_distances'][run_idx], instrumentation
+                    )
+                if instrumentation is not None:
+                    instrumentation.count('runs')
+                    instrumentation.count('steps', n_steps)
+                with phase(instrumentation, 'results'):
+                    infected = infection_times >= 0
+                    result['n_steps'][run_idx] = n_steps
+                    new_infections = np.bincount(infection_times[infection_times > 0] - 1, minlength=max_steps)
+                    result['new_infections_per_step'][run_idx] = new_infections[:max_steps]
+                    result['secondary_infections'][run_idx] = np.bincount(parents[infected & (parents >= 0)],
+                                                                          minlength=N)
+                    result['is_superspreader'][run_idx] = is_superspreader
+                    recovered = infected & (infection_times + infectious_periods <= n_steps)
+                    result['states'][run_idx] = np.where(recovered, 2, np.where(infected, 1, 0))
+        return results
+    
+    def _traverse(self, graph, contact_draws, infectious_periods, is_superspreader, kernel, max_steps,
+                  origin_distances, front_threshold, max_distances, instrumentation=None):
+        """Epidemic on a contact graph, processed step by step from a queue of scheduled transmissions
+        
+        When an individual is infected, the step at which each of its contacts
+        would transmit is computed at once; a step then only has to apply the
+        transmissions scheduled for it to targets that are still susceptible.
+        
+        Args: 
+            max_distances (np.ndarray): Output (max_steps,) front distance per step,
+                holding the last value after the epidemic ends
+        
+        Returns: 
+            tuple: (infection_times, parents, n_steps) with -1 for the never
+                infected and for patient zero's parent
+        """
+        N = graph.N
+        infection_times = np.full(N, -1, dtype=np.int64)
+        parents = np.full(N, -1, dtype=np.int64)
+        infection_times[0] = 0
+        scheduled = {}  # step -> list of (sources, targets) transmissions
+        
+        def schedule(sources, time):
+            edges, edge_sources = graph.out_edges(sources)
+            probs = kernel(graph.r2[edges], is_superspreader[edge_sources])
+            possible = probs > 0
+            if instrumentation is not None:
+                instrumentation.count('pairs_evaluated', len(edges))
+                instrumentation.count('pairs_in_range', np.count_nonzero(possible))
+            edges, edge_sources, probs = edges[possible], edge_sources[possible], probs[possible]
+            # Attempt at which the contact first succeeds, Geometric(p) by inversion;
+            # attempts beyond the horizon (inf or NaN where log1p(-p) underflows) never fire
+            with np.errstate(divide='ignore', invalid='ignore'):
+                attempts = np.maximum(1, np.ceil(np.log(contact_draws[edges]) / np.log1p(-probs)))
+            attempts = np.fmin(attempts, max_steps + 1)
+            steps = time + attempts.astype(np.int64) - 1
+            keep = (attempts <= infectious_periods[edge_sources]) & (steps < max_steps)
+            for step in np.unique(steps[keep]):
+                at_step = keep & (steps == step)
+                scheduled.setdefault(int(step), []).append((edge_sources[at_step], graph.indices[edges[at_step]]))
+        
+        schedule(np.array([0]), 0)
+        last_infectious = infectious_periods[0] - 1
+        front = 0.0
+        n_steps = 0
+        for step in range(max_steps):
+            if step > last_infectious:
+                break
+            n_steps = step + 1
+            max_distances[step] = front
+            if front_threshold is not None and front >= front_threshold:
+                break
+            
+            transmissions = scheduled.pop(step, None)
+            if transmissions is None:
+                continue
+            sources = np.concatenate([s for s, _ in transmissions])
+            targets = np.concatenate([t for _, t in transmissions])
+            susceptible = infection_times[targets] < 0
+            sources, targets = sources[susceptible], targets[susceptible]
+            if len(targets) == 0:
+                continue
+            
+            # Attribute each target to its first infector in index order
+            order = np.argsort(sources, kind='stable')
+            targets, first = np.unique(targets[order], return_index=True)
+            sources = sources[order][first]
+            infection_times[targets] = step + 1
+            parents[targets] = sources
+            front = max(front, origin_distances[targets].max())
+            last_infectious = max(last_infectious, step + infectious_periods[targets].max())
+            schedule(targets, step + 1)
+        
+        if n_steps > 0:
+            max_distances[n_steps:] = max_distances[n_steps - 1]
+        return infection_times, parents, n_steps
@@ -0,0 +1,167 @@
+import numpy as np
+
+
+class MeanVariance:
+    def __init__(self):
+        """Running mean and variance of a stream of equally shaped values
+
+        Batches are folded in with the pairwise update of Chan et al., the
+        batch version of Welford's algorithm, so neither the values nor their
+        squares are ever summed in bulk. Two accumulators over disjoint runs
+        merge into the accumulator of all of them.
+        """
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    def _combine(self, count, mean, m2):
+        if count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = count, mean, m2
+            return self
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta**2 * (self.count * count / total)
+        self.count = total
+        return self
+
+    def add(self, values: np.ndarray):
+        """Fold in a batch of values, one per entry along the first axis"""
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return self
+        mean = values.mean(axis=0)
+        return self._combine(len(values), mean, ((values - mean)**2).sum(axis=0))
+
+    def merge(self, other: "MeanVariance"):
+        """Fold in another accumulator"""
+        return self._combine(other.count, other.mean, other.m2)
+
+    @property
+    def variance(self):
+        """Population variance (ddof=0), as np.var"""
+        return self.m2 / self.count
+
+    @property
+    def std(self):
+        """Population standard deviation, as np.std"""
+        return np.sqrt(self.variance)
+
+
+class IntegerHistogram:
+    def __init__(self):
+        """Counts of non-negative integers, growing to the largest value seen"""
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def _combine(self, counts: np.ndarray):
+        if len(counts) > len(self.counts):
+            counts, self.counts = self.counts, np.array(counts, dtype=np.int64)
+        self.counts[:len(counts)] += counts
+        return self
+
+    def add(self, values: np.ndarray):
+        """Fold in a batch of integers"""
+        return self._combine(np.bincount(np.asarray(values, dtype=np.int64)))
+
+    def merge(self, other: "IntegerHistogram"):
+        """Fold in another accumulator"""
+        return self._combine(other.counts)
+
+
+class BinnedQuantiles:
+    def __init__(self, edges: np.ndarray):
+        """Streaming quantiles of values in a known range, from a fixed-bin histogram
+
+        Unlike sketches with data-dependent bins, two accumulators with the same
+        edges merge exactly. Values may have a trailing shape (e.g. one value
+        per time step); quantiles are then computed per position.
+
+        Parameters:
+
+            edges (np.ndarray): Increasing bin edges; quantiles are resolved to
+                within one bin, values outside [edges[0], edges[-1]] are clipped
+        """
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = None
+        self.count = 0
+
+    def add(self, values: np.ndarray):
+        """Fold in a batch of values, one per entry along the first axis"""
+        values = np.asarray(values, dtype=float)
+        if self.counts is None:
+            self.counts = np.zeros((len(self.edges) - 1, *values.shape[1:]), dtype=np.int64)
+        n_bins = len(self.edges) - 1
+        bins = np.clip(np.searchsorted(self.edges, values, side='right') - 1, 0, n_bins - 1)
+        flat = self.counts.reshape(n_bins, -1)
+        np.add.at(flat, (bins.reshape(len(values), -1), np.arange(flat.shape[1])), 1)
+        self.count += len(values)
+        return self
+
+    def merge(self, other: "BinnedQuantiles"):
+        """Fold in another accumulator with the same edges"""
+        if other.counts is not None:
+            self.counts = other.counts.copy() if self.counts is None else self.counts + other.counts
+            self.count += other.count
+        return self
+
+    def quantile(self, q: float):
+        """Value below which a fraction q of the values lie, interpolated within its bin"""
+        cumulative = np.cumsum(self.counts, axis=0)
+        target = q * self.count
+        bins = np.minimum((cumulative < target).sum(axis=0), len(self.counts) - 1)
+        below = np.where(bins > 0, np.take_along_axis(cumulative, np.maximum(bins - 1, 0)[None], 0)[0], 0)
+        inside = np.take_along_axis(self.counts, np.asarray(bins)[None], 0)[0]
+        fraction = np.where(inside > 0, (target - below) / np.maximum(inside, 1), 0)
+        return self.edges[bins] + fraction * np.diff(self.edges)[bins]
+
+
+class Samples:
+    def __init__(self):
+        """Every value seen, in the order folded in
+
+        For per-replica statistics that need all replicas, such as bootstrap
+        intervals; memory grows with the number of runs, so only small
+        per-run summaries should be kept this way.
+        """
+        self.values = None
+
+    def add(self, values: np.ndarray):
+        """Fold in a batch of values, one per entry along the first axis"""
+        values = np.asarray(values)
+        self.values = values.copy() if self.values is None else np.concatenate([self.values, values])
+        return self
+
+    def merge(self, other: "Samples"):
+        """Fold in another accumulator, its values after these"""
+        return self if other.values is None else self.add(other.values)
+
+    @property
+    def count(self):
+        return 0 if self.values is None else len(self.values)
+
+
+class ThresholdCount:
+    def __init__(self, threshold: float):
+        """Number of values at or above a threshold, out of all values seen
+
+        Parameters:
+
+            threshold (float): Smallest value counted
+        """
+        self.threshold = threshold
+        self.count = 0
+        self.n = 0
+
+    def add(self, values: np.ndarray):
+        """Fold in a batch of values"""
+        self.count += int(np.count_nonzero(np.asarray(values) >= self.threshold))
+        self.n += len(values)
+        return self
+
+    def merge(self, other: "ThresholdCount"):
+        """Fold in another accumulator"""
+        self.count += other.count
+        self.n += other.n
+        return self
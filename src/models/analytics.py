@@ -0,0 +1,123 @@
+import numpy as np
+
+# Steps the front velocity is fitted over, later steps being too noisy
+VELOCITY_WINDOW = 5
+# Statistics of `curve_statistics`, in column order of `stack_statistics`
+CURVE_STATISTICS = ('peak_day', 'peak_height', 'width', 'asymmetry', 'final_size')
+
+
+def front_velocities(max_distances: np.ndarray, n_steps: np.ndarray, window: int = VELOCITY_WINDOW):
+    """Least-squares front velocity of every run, over its first `window` steps
+
+    The slope of a line fitted to y_0..y_{w-1} at x = 0..w-1 is
+    Σ (x - x̄) y / Σ (x - x̄)², so all runs are fitted by one matrix product
+    instead of one np.polyfit each.
+
+    Args:
+        max_distances (np.ndarray): (runs, steps) front distances
+        n_steps (np.ndarray): Steps run by each run
+        window (int): Number of leading steps fitted
+
+    Returns:
+        np.ndarray: Slopes clipped at 0, NaN for runs of at most `window` steps
+    """
+    max_distances = np.asarray(max_distances, dtype=float)
+    if max_distances.shape[-1] < window:
+        return np.full(max_distances.shape[:-1], np.nan)
+    x = np.arange(window) - (window - 1) / 2
+    slopes = max_distances[..., :window] @ x / (x @ x)
+    return np.where(np.asarray(n_steps) > window, np.maximum(slopes, 0), np.nan)
+
+
+def curve_statistics(curves: np.ndarray, threshold: float = 0.1):
+    """Shape statistics of epidemic curves, for every curve at once
+
+    Args:
+        curves (np.ndarray): (..., steps) new infections per step, e.g. one
+            curve per run or a single averaged curve
+        threshold (float): Fraction of its peak above which a step counts
+            towards the width of a curve
+
+    Returns:
+        dict: Arrays of shape (...,): 'peak_day' and 'peak_height', 'width'
+            (steps above threshold × peak), 'asymmetry' (fall time over rise
+            time of the peak, inf if it peaks at step 0) and 'final_size'
+            (sum of the curve)
+    """
+    curves = np.asarray(curves, dtype=float)
+    peak_day = curves.argmax(axis=-1)
+    peak_height = curves.max(axis=-1)
+    rise = peak_day
+    fall = curves.shape[-1] - peak_day - 1
+    with np.errstate(divide='ignore'):
+        asymmetry = np.where(rise > 0, fall / np.maximum(rise, 1), np.inf)
+    return {
+        'peak_day': peak_day,
+        'peak_height': peak_height,
+        'width': (curves > threshold * peak_height[..., None]).sum(axis=-1),
+        'asymmetry': asymmetry,
+        'final_size': curves.sum(axis=-1),
+    }
+
+
+def stack_statistics(statistics: dict):
+    """(..., len(CURVE_STATISTICS)) array of the output of `curve_statistics`"""
+    return np.stack([np.asarray(statistics[name], dtype=float) for name in CURVE_STATISTICS], axis=-1)
+
+
+def bootstrap_interval(values: np.ndarray, statistic=np.mean, n_resamples: int = 1000, confidence: float = 0.95,
+                       rng=None):
+    """Percentile bootstrap confidence interval of a statistic over replicas
+
+    All resamples are drawn as one (n_resamples, replicas) index array and
+    reduced by a single call of `statistic`.
+
+    Args:
+        values (np.ndarray): One entry per replica along the first axis
+        statistic (callable): Reduction taking an `axis` argument, e.g. np.mean,
+            np.median or np.nanmean
+        n_resamples (int): Number of bootstrap resamples
+        confidence (float): Coverage of the interval
+        rng (np.random.Generator or int): Random generator or seed
+
+    Returns:
+        tuple: (lower, upper) bounds, shaped like `statistic` of one replica set
+    """
+    values = np.asarray(values)
+    rng = np.random.default_rng(rng)
+    resamples = values[rng.integers(0, len(values), size=(n_resamples, len(values)))]
+    estimates = statistic(resamples, axis=1)
+    tail = (1 - confidence) / 2
+    lower, upper = np.quantile(estimates, [tail, 1 - tail], axis=0)
+    return lower, upper
+
+
+def replica_summary(values: np.ndarray, statistic=np.mean, n_resamples: int = 1000, confidence: float = 0.95,
+                    rng=0):
+    """Statistic of per-replica values with its bootstrap interval, over the finite replicas
+
+    Non-finite values, such as the infinite asymmetry of a curve that peaks
+    at once, would make whole resamples infinite and the interval NaN, so
+    they are left out and counted instead.
+
+    Args:
+        values (np.ndarray): One value per replica
+        statistic (callable): Reduction taking an `axis` argument, e.g. np.mean
+        n_resamples (int): Number of bootstrap resamples
+        confidence (float): Coverage of the interval
+        rng (np.random.Generator or int): Random generator or seed of the resampling
+
+    Returns:
+        dict: 'value' of the statistic, 'ci' (lower, upper) bounds and
+            'n_dropped' non-finite replicas; NaN value and bounds if none is finite
+    """
+    values = np.asarray(values, dtype=float)
+    finite = np.isfinite(values)
+    kept = values[finite]
+    if len(kept) == 0:
+        return {'value': np.nan, 'ci': (np.nan, np.nan), 'n_dropped': len(values)}
+    return {
+        'value': statistic(kept),
+        'ci': bootstrap_interval(kept, statistic, n_resamples, confidence, rng),
+        'n_dropped': int(np.count_nonzero(~finite)),
+    }
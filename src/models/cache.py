@@ -0,0 +1,142 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import hashlib
+import argparse
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.environ.get("SIR_CACHE_DIR", os.path.join(".cache", "simulations"))
+DEFAULT_MAX_BYTES = int(os.environ.get("SIR_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+
+class ResultCache:
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        """On-disk cache of aggregated Monte Carlo results
+
+        Entries are compressed .npz files named by a hash of everything that
+        determines the result. Reading an entry refreshes its modification time,
+        and the least recently used entries are evicted once the cache grows
+        beyond `max_bytes`.
+
+        Parameters:
+
+            directory (str): Cache directory, created on first write
+            max_bytes (int): Size bound of the cache directory
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(sim, scenario, seed: int, engine: str):
+        """Hash of the model parameters, the run configuration and the engine tag
+
+        Args:
+            sim (SIRSimulation): Model parameters
+            scenario (Scenario): Run configuration
+            seed (int): Root seed
+            engine (str): Engine version tag, including anything else that
+                changes the random stream (e.g. the chunk size)
+
+        Returns:
+            str: Hex digest identifying the entry
+        """
+        payload = {
+            'sim': {name: float(getattr(sim, name)) for name in ('r0', 'w0', 'gamma', 'alpha', 'L')},
+            'scenario': list(scenario),
+            'seed': seed,
+            'engine': engine,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key: str):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key: str):
+        """Load an entry
+
+        Returns:
+            dict: {observable: {field: array}}, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                summary = {}
+                for name in data.files:
+                    observable, field = name.rsplit('.', 1)
+                    summary.setdefault(observable, {})[field] = data[name]
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return summary
+
+    def put(self, key: str, summary: dict):
+        """Store an entry, merging it with observables already cached under `key`
+
+        The file is written to a temporary name and renamed, so a reader never
+        sees a partial entry.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        merged = self.get(key) or {}
+        merged.update(summary)
+        arrays = {f"{observable}.{field}": value
+                  for observable, fields in merged.items() for field, value in fields.items()}
+
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, self._path(key))
+        self.evict(keep=key)
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return sorted(entries)
+
+    def size(self):
+        """Total size of the cached entries in bytes"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep: str = None):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            if name == f"{keep}.npz":
+                continue
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        """Invalidate the whole cache
+
+        Returns:
+            int: Number of entries removed
+        """
+        entries = self._entries()
+        for _, _, name in entries:
+            os.remove(os.path.join(self.directory, name))
+        return len(entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the simulation result cache")
+    parser.add_argument("command", choices=["info", "clear"])
+    parser.add_argument("--dir", default=DEFAULT_CACHE_DIR, help="Cache directory")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.dir)
+    if args.command == "clear":
+        print(f"Removed {cache.clear()} entries from {cache.directory}")
+    else:
+        print(f"{len(cache._entries())} entries, {cache.size() / 1024 ** 2:.1f} MiB in {cache.directory}")
@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class PeriodicCellList:
+    def __init__(self, positions: np.ndarray, L: float, cutoff: float):
+        """Bins points of a periodic square into cells at least `cutoff` wide
+
+        Any pair of points closer than `cutoff` (under periodic boundaries) lies
+        in the same or in adjacent cells, so a neighbor query only has to scan
+        the 3x3 block of cells around the query point.
+
+        Parameters:
+
+            positions (np.ndarray): Point coordinates of shape (N, 2) in [0, L)
+            L (float): Side length of the periodic square
+            cutoff (float): Largest interaction distance that will be queried
+        """
+        self.L = L
+        self.n_cells = max(1, int(L // cutoff))
+        self.cell_size = L / self.n_cells
+
+        cells = np.floor(positions / self.cell_size).astype(np.int64) % self.n_cells
+        self.cell_ids = cells[:, 0] * self.n_cells + cells[:, 1]
+
+        # CSR layout: members of cell c are order[cell_start[c]:cell_start[c + 1]]
+        self.order = np.argsort(self.cell_ids, kind='stable')
+        self.cell_start = np.searchsorted(self.cell_ids[self.order], np.arange(self.n_cells ** 2 + 1))
+        self._candidates = {}
+
+    def _neighbor_cells(self, cell_id: int):
+        """Return the ids of the cells in the 3x3 block around a cell
+
+        With fewer than three cells per side the block wraps onto itself, so
+        duplicates are removed to avoid returning the same point twice.
+        """
+        cx, cy = divmod(cell_id, self.n_cells)
+        offsets = np.arange(-1, 2)
+        xs = (cx + offsets) % self.n_cells
+        ys = (cy + offsets) % self.n_cells
+        return np.unique((xs[:, None] * self.n_cells + ys[None, :]).ravel())
+
+    def neighbors(self, idx: int):
+        """Return candidate neighbors of a point
+
+        Args:
+            idx (int): Index of the query point
+
+        Returns:
+            np.ndarray: Indices of every point in the cells around `idx`, the
+                point itself included. Callers still have to apply the exact
+                distance cutoff.
+        """
+        cell_id = self.cell_ids[idx]
+        candidates = self._candidates.get(cell_id)
+        if candidates is None:
+            candidates = np.concatenate([
+                self.order[self.cell_start[c]:self.cell_start[c + 1]]
+                for c in self._neighbor_cells(cell_id)
+            ])
+            self._candidates[cell_id] = candidates
+        return candidates
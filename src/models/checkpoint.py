@@ -0,0 +1,101 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import pickle
+import hashlib
+
+from models.cache import ResultCache
+
+DEFAULT_CHECKPOINT_DIR = os.environ.get("SIR_CHECKPOINT_DIR", os.path.join(".cache", "checkpoints"))
+DEFAULT_INTERVAL = float(os.environ.get("SIR_CHECKPOINT_INTERVAL", 60))
+
+
+class SweepCheckpoint:
+    def __init__(self, directory: str = DEFAULT_CHECKPOINT_DIR, interval: float = DEFAULT_INTERVAL):
+        """On-disk partial results of the scenarios of a running sweep
+
+        A cell (one scenario and its observables) is checkpointed as the number
+        of runs done and the observable accumulators of those runs. Chunk i of
+        a scenario always draws from the i-th child of its seed sequence, so
+        the run count is also the position in the random stream: a resumed
+        sweep continues with the next chunk and merges it into the restored
+        accumulators exactly as the uninterrupted sweep would have, giving
+        bit-identical results.
+
+        Updates are kept in memory and written, one file per cell, at most
+        every `interval` seconds, each to a temporary name that is then
+        renamed, so a crash never leaves a partial checkpoint behind.
+
+        Parameters:
+
+            directory (str): Checkpoint directory, created on first write
+            interval (float): Seconds between writes; 0 writes on every update
+        """
+        self.directory = directory
+        self.interval = interval
+        self._dirty = {}
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def key(sim, scenario, seed: int, engine: str, observables):
+        """Hash of everything that determines the partial results of a cell
+
+        Args:
+            sim, scenario, seed, engine: As in `ResultCache.key`
+            observables (list): Observables accumulated for the cell
+
+        Returns:
+            str: Hex digest identifying the cell
+        """
+        cell = f"{ResultCache.key(sim, scenario, seed, engine)}/{list(observables)!r}"
+        return hashlib.sha256(cell.encode()).hexdigest()
+
+    def _path(self, key: str):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def load(self, key: str):
+        """Last written state of a cell
+
+        Returns:
+            tuple: (runs done, {observable: accumulator}), or None if the cell
+                has no usable checkpoint
+        """
+        try:
+            with open(self._path(key), 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return state['n_done'], state['accumulators']
+
+    def update(self, key: str, n_done: int, accumulators: dict):
+        """Record the state of a cell after `n_done` runs, writing due checkpoints
+
+        The accumulators are pickled when written, not when recorded, so they
+        must not be modified between the update and the next one.
+        """
+        self._dirty[key] = (n_done, accumulators)
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Write the recorded states of all cells updated since the last write"""
+        if self._dirty:
+            os.makedirs(self.directory, exist_ok=True)
+        for key, (n_done, accumulators) in self._dirty.items():
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'n_done': n_done, 'accumulators': accumulators}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        self._dirty.clear()
+        self._last_flush = time.monotonic()
+
+    def discard(self, key: str):
+        """Forget a cell whose results are complete"""
+        self._dirty.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
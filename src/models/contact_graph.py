@@ -0,0 +1,65 @@
+import numpy as np
+
+from models.cell_list import PeriodicCellList
+
+
+class ContactGraph:
+    def __init__(self, positions: np.ndarray, L: float, cutoff: float):
+        """Directed pairs of individuals within `cutoff` of each other, in CSR form
+
+        The out-edges of individual i are indices[indptr[i]:indptr[i + 1]],
+        sorted by target, with squared periodic distances in `r2`. The graph
+        depends on the positions only, so one graph serves every superspreader
+        fraction and every model whose largest cutoff is at most `cutoff`.
+
+        Parameters:
+
+            positions (np.ndarray): Coordinates of shape (N, 2) in [0, L)
+            L (float): Side length of the periodic square
+            cutoff (float): Largest interaction distance
+        """
+        N = len(positions)
+        cells = PeriodicCellList(positions, L, cutoff)
+        sources, targets, squared = [], [], []
+        for cell_id in range(cells.n_cells ** 2):
+            members = cells.order[cells.cell_start[cell_id]:cells.cell_start[cell_id + 1]]
+            if len(members) == 0:
+                continue
+            candidates = cells.neighbors(members[0])
+            d = np.abs(positions[members][:, None, :] - positions[candidates][None, :, :])
+            d = np.minimum(d, L - d)
+            r2 = d[..., 0]**2 + d[..., 1]**2
+            rows, cols = np.nonzero((r2 <= cutoff**2) & (members[:, None] != candidates[None, :]))
+            sources.append(members[rows])
+            targets.append(candidates[cols])
+            squared.append(r2[rows, cols])
+
+        sources = np.concatenate(sources) if sources else np.array([], dtype=np.int64)
+        targets = np.concatenate(targets) if targets else np.array([], dtype=np.int64)
+        squared = np.concatenate(squared) if squared else np.array([])
+        order = np.lexsort((targets, sources))
+        self.N = N
+        self.cutoff = cutoff
+        self.indices = targets[order]
+        self.r2 = squared[order]
+        self.indptr = np.searchsorted(sources[order], np.arange(N + 1))
+
+    @property
+    def n_edges(self):
+        return len(self.indices)
+
+    def out_edges(self, sources: np.ndarray):
+        """Edges leaving a set of individuals
+
+        Args:
+            sources (np.ndarray): Individual indices
+
+        Returns:
+            tuple: (edges, edge_sources) edge indices into `indices`/`r2`, and
+                the source of each edge
+        """
+        starts = self.indptr[sources]
+        counts = self.indptr[sources + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        edges = offsets + np.arange(counts.sum())
+        return edges, np.repeat(sources, counts)
@@ -0,0 +1,220 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import warnings
+from typing import NamedTuple
+from statistics import NormalDist
+
+import numpy as np
+
+from models.runner import Scenario, run_observables
+from models.observables import percolation
+
+
+class CriticalDensity(NamedTuple):
+    """Estimated percolation transition of one model and superspreader fraction
+
+    Attributes:
+        N (float): Number of individuals at which the percolation probability
+            is 0.5, NaN if it does not cross 0.5 within the searched range
+        lower (float): Lower confidence bound of N, -inf if the crossing is
+            below every evaluated N
+        upper (float): Upper confidence bound of N, inf if the crossing is
+            above every evaluated N
+        N_values (np.ndarray): Evaluated numbers of individuals
+        counts (np.ndarray): Percolated runs at each evaluated N
+        n_runs (np.ndarray): Runs at each evaluated N
+    """
+    N: float
+    lower: float
+    upper: float
+    N_values: np.ndarray
+    counts: np.ndarray
+    n_runs: np.ndarray
+
+
+def fit_logistic(x, counts, n_runs, max_iter: int = 50):
+    """Maximum likelihood fit of logit(p) = b0 + b1 * x to binomial counts
+
+    Args:
+        x (np.ndarray): Covariate of each point
+        counts (np.ndarray): Successes at each point
+        n_runs (np.ndarray): Trials at each point
+        max_iter (int): Maximum Newton iterations
+
+    Returns:
+        tuple: (coefficients, covariance), or None if the maximum likelihood
+            estimate does not exist (separated or degenerate data)
+    """
+    x, counts, n_runs = (np.asarray(a, dtype=float) for a in (x, counts, n_runs))
+    fractions = counts / n_runs
+    order = np.argsort(x)
+    # Completely separated data, e.g. only 0/1 fractions in increasing order, has no finite fit
+    if np.all((fractions == 0) | (fractions == 1)) and np.all(np.diff(fractions[order]) >= 0):
+        return None
+
+    X = np.column_stack([np.ones_like(x), x])
+    beta = np.zeros(2)
+    for _ in range(max_iter):
+        p = 1 / (1 + np.exp(-(X @ beta)))
+        information = X.T @ ((n_runs * p * (1 - p))[:, None] * X)
+        try:
+            step = np.linalg.solve(information, X.T @ (counts - n_runs * p))
+        except np.linalg.LinAlgError:
+            return None
+        beta += step
+        if np.max(np.abs(step)) < 1e-10:
+            break
+    if not np.all(np.isfinite(beta)):
+        return None
+    p = 1 / (1 + np.exp(-(X @ beta)))
+    try:
+        covariance = np.linalg.inv(X.T @ ((n_runs * p * (1 - p))[:, None] * X))
+    except np.linalg.LinAlgError:
+        return None
+    return beta, covariance
+
+
+def estimate_crossing(N_values, counts, n_runs, N_range, confidence: float = 0.95):
+    """Estimate where the percolation probability crosses 0.5
+
+    A logistic curve in N is fitted to the counts and the crossing is -b0/b1,
+    with delta-method confidence bounds. When the fit does not exist or is not
+    increasing, the crossing is bracketed between the largest N with an
+    estimated probability below 0.5 and the next evaluated N above it. If
+    every evaluated probability is on the same side of 0.5 (or none above 0.5
+    follows the last one below), the crossing is out of the evaluated range:
+    the estimate is NaN and the open side of the bracket is infinite.
+
+    Args:
+        N_values (np.ndarray): Evaluated numbers of individuals
+        counts (np.ndarray): Percolated runs at each N
+        n_runs (np.ndarray): Runs at each N
+        N_range (tuple): (min, max) numbers of individuals searched
+        confidence (float): Coverage of the bounds
+
+    Returns:
+        tuple: (estimate, lower, upper, slope) where slope is the fitted logit
+            slope per individual, or None for a bracket
+    """
+    N_values = np.asarray(N_values, dtype=float)
+    center = (N_range[0] + N_range[1]) / 2
+    scale = (N_range[1] - N_range[0]) / 2
+    fit = fit_logistic((N_values - center) / scale, counts, n_runs)
+    if fit is not None and fit[0][1] > 0:
+        (b0, b1), covariance = fit
+        estimate = center - scale * b0 / b1
+        gradient = scale * np.array([-1 / b1, b0 / b1 ** 2])
+        half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * np.sqrt(gradient @ covariance @ gradient)
+        if N_range[0] <= estimate <= N_range[1]:
+            return estimate, estimate - half_width, estimate + half_width, b1 / scale
+
+    fractions = np.asarray(counts) / np.asarray(n_runs)
+    below = N_values[fractions < 0.5]
+    if len(below) == 0:
+        return np.nan, -np.inf, N_values.min(), None
+    lower = below.max()
+    above = N_values[(fractions >= 0.5) & (N_values > lower)]
+    if len(above) == 0:
+        return np.nan, lower, np.inf, None
+    upper = above.min()
+    return (lower + upper) / 2, lower, upper, None
+
+
+def find_critical_densities(sim, targets, N_range=(150, 900), n_runs: int = 100, n_initial: int = 5,
+                            points_per_round: int = 4, max_rounds: int = 6, tolerance: float = 10,
+                            max_steps: int = 100, initial_pos=(0, 0), confidence: float = 0.95, seed: int = 0,
+                            n_workers: int = None, cache=None, desc: str = None, engine: str = 'ensemble',
+                            instrumentation=None):
+    """Locate the N at which the percolation probability is 0.5, by sequential design
+
+    Each search starts from `n_initial` evenly spaced N values. Every round
+    then fits the percolation probability (see `estimate_crossing`) and places
+    `points_per_round` new N values around the current estimate: at the
+    probabilities 0.15..0.85 of the fitted logistic curve, or evenly inside the
+    bracket while no fit exists. A search stops once its confidence interval
+    is narrower than `tolerance` individuals or after `max_rounds` rounds. A
+    search whose probability does not cross 0.5 within `N_range` stops with
+    a warning and a NaN estimate, see `estimate_crossing`.
+
+    The searches of all targets advance together, so every round is a single
+    batch of percolation-only scenarios that the runner stops early and spreads
+    over the process pool.
+
+    Args:
+        sim (SIRSimulation): Model parameters
+        targets (list): (lambda_val, model_type, threshold) triples
+        N_range (tuple): (min, max) numbers of individuals searched
+        n_runs (int): Runs per evaluated N
+        n_initial (int): Number of evenly spaced initial N values
+        points_per_round (int): N values added per round
+        max_rounds (int): Maximum refinement rounds
+        tolerance (float): Target confidence interval width, in individuals
+        max_steps (int): Maximum simulation steps
+        initial_pos (tuple): Initial infected position
+        confidence (float): Coverage of the confidence bounds
+        seed (int): Root seed
+        n_workers (int): Number of worker processes, os.cpu_count() if None
+        cache (ResultCache): Result cache consulted before simulating, if any
+        desc (str): Progress bar label
+        engine (str): "ensemble" or "graph", see `models.runner.run_scenarios`
+        instrumentation (Instrumentation): Optional aggregate of the engine
+            counters and timers, see `models.runner.run_observables`
+
+    Returns:
+        list: One CriticalDensity per target, in order
+    """
+    evaluated = [{} for _ in targets]  # N -> (count, n_runs)
+    proposals = [np.linspace(N_range[0], N_range[1], n_initial) for _ in targets]
+    estimates = [None] * len(targets)
+    pending = list(range(len(targets)))
+
+    for _ in range(max_rounds + 1):
+        requests = []
+        owners = []
+        for i in pending:
+            lambda_val, model_type, threshold = targets[i]
+            for N in np.unique(np.clip(np.round(proposals[i]), *N_range).astype(int)):
+                if int(N) not in evaluated[i]:
+                    requests.append((Scenario(int(N), lambda_val, model_type, n_runs, max_steps, initial_pos),
+                                     [percolation(threshold)]))
+                    owners.append(i)
+        if not requests:
+            break
+        summaries = run_observables(sim, requests, seed, n_workers, desc=desc, cache=cache, engine=engine,
+                                    instrumentation=instrumentation)
+        for i, (scenario, observables), summary in zip(owners, requests, summaries):
+            result = summary[observables[0]]
+            evaluated[i][scenario.N] = (int(result['count']), int(result['n_runs']))
+
+        still_pending = []
+        for i in pending:
+            N_values = np.array(sorted(evaluated[i]))
+            counts, runs = np.array([evaluated[i][N] for N in N_values]).T
+            estimate, lower, upper, slope = estimate_crossing(N_values, counts, runs, N_range, confidence)
+            estimates[i] = (estimate, lower, upper)
+            if np.isnan(estimate):
+                side = 'below' if np.isinf(lower) else 'above'
+                warnings.warn(f"Percolation probability of target {targets[i]} does not cross 0.5 in N {N_range}; "
+                              f"the crossing is {side} the evaluated range")
+                continue
+            if upper - lower <= tolerance:
+                continue
+            if slope is None:
+                proposals[i] = np.linspace(lower, upper, points_per_round + 2)[1:-1]
+            else:
+                quantiles = np.linspace(0.15, 0.85, points_per_round)
+                proposals[i] = estimate + np.log(quantiles / (1 - quantiles)) / slope
+            still_pending.append(i)
+        pending = still_pending
+        if not pending:
+            break
+
+    results = []
+    for i, (estimate, lower, upper) in enumerate(estimates):
+        N_values = np.array(sorted(evaluated[i]))
+        counts, runs = np.array([evaluated[i][N] for N in N_values]).T
+        results.append(CriticalDensity(estimate, lower, upper, N_values, counts, runs))
+    return results
@@ -0,0 +1,173 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+
+import numpy as np
+
+from models.runner import normalize_scenario
+from models.analytics import CURVE_STATISTICS
+from models.observables import FINAL_SIZE_QUANTILES, FRONT_VELOCITY, QUANTILE_FIELDS, percolation_threshold
+
+# Model parameters and scenario fields stored on every row
+SIM_COLUMNS = ('r0', 'w0', 'gamma', 'alpha', 'L')
+SCENARIO_COLUMNS = ('N', 'lambda_val', 'model_type', 'n_runs', 'max_steps', 'initial_x', 'initial_y')
+# Summary fields of `models.observables.summarize` -> dtype they are restored to
+FIELDS = {'mean': np.float64, 'std': np.float64, 'counts': np.int64, 'count': np.int64, 'n_runs': np.int64,
+          'ci_lower': np.float64, 'ci_upper': np.float64,
+          **dict.fromkeys(CURVE_STATISTICS, np.float64), **dict.fromkeys(QUANTILE_FIELDS, np.float64)}
+# Key of the JSON metadata in the Parquet schema
+METADATA_KEY = b'sir'
+
+
+def _scalar(observable: str):
+    """Whether the summary fields of an observable are 0-d"""
+    return observable in (FRONT_VELOCITY, FINAL_SIZE_QUANTILES) or percolation_threshold(observable) is not None
+
+
+def _identity(sim, scenario):
+    scenario = normalize_scenario(scenario)
+    return {
+        **{name: float(getattr(sim, name)) for name in SIM_COLUMNS},
+        'N': scenario.N,
+        'lambda_val': float(scenario.lambda_val),
+        'model_type': scenario.model_type,
+        'n_runs': scenario.n_runs,
+        'max_steps': scenario.max_steps,
+        'initial_x': float(scenario.initial_pos[0]),
+        'initial_y': float(scenario.initial_pos[1]),
+    }
+
+
+def summaries_frame(requests, summaries):
+    """Tidy table of the summaries of a set of requests
+
+    Rows are one (scenario, observable, index) each, where the index is the
+    time step of curves, the number of secondary infections of histograms,
+    the replica of per-run statistics and 0 for scalar observables. Summary
+    fields are columns, missing ones are NaN. Since the summary field 'n_runs'
+    of percolation observables would clash with the scenario's run count, it
+    is stored as 'runs_done'.
+
+    Args:
+        requests (list): (sim, scenario, observables) triples
+        summaries (list): {observable: {field: array}} per request, in order
+
+    Returns:
+        pd.DataFrame: The table
+    """
+    import pandas as pd
+
+    blocks = []
+    for (sim, scenario, observables), summary in zip(requests, summaries):
+        identity = _identity(sim, scenario)
+        for observable in dict.fromkeys(observables):
+            fields = {('runs_done' if field == 'n_runs' else field): np.atleast_1d(value)
+                      for field, value in summary[observable].items()}
+            length = max(len(value) for value in fields.values())
+            block = pd.DataFrame({field: value.astype(float) for field, value in fields.items()})
+            block.insert(0, 'index', np.arange(length))
+            block.insert(0, 'observable', observable)
+            for column, value in reversed(identity.items()):
+                block.insert(0, column, value)
+            blocks.append(block)
+    frame = pd.concat(blocks, ignore_index=True)
+    frame['model_type'] = frame['model_type'].astype('category')
+    frame['observable'] = frame['observable'].astype('category')
+    return frame
+
+
+def summaries_from_frame(frame, requests):
+    """Summaries of `requests` read back from a `summaries_frame` table
+
+    Returns:
+        list: {observable: {field: array}} per request, in order, as
+            `models.runner.run_observables` returns them
+
+    Raises:
+        KeyError: If the table has no rows for a requested observable
+    """
+    frame = frame.assign(model_type=frame['model_type'].astype(str), observable=frame['observable'].astype(str))
+    groups = dict(list(frame.groupby([*SIM_COLUMNS, *SCENARIO_COLUMNS, 'observable'], sort=False, observed=True)))
+    results = []
+    for sim, scenario, observables in requests:
+        identity = _identity(sim, scenario)
+        summary = {}
+        for observable in observables:
+            key = (*identity.values(), observable)
+            if key not in groups:
+                raise KeyError(f"No rows for {observable} of {normalize_scenario(scenario)}")
+            rows = groups[key].sort_values('index')
+            fields = {}
+            for column, dtype in FIELDS.items():
+                source = 'runs_done' if column == 'n_runs' else column
+                if source not in rows or rows[source].isna().all():
+                    continue
+                values = rows[source].to_numpy().astype(dtype)
+                fields[column] = np.array(values[0]) if _scalar(observable) else values
+            summary[observable] = fields
+        results.append(summary)
+    return results
+
+
+def write_dataset(path: str, frame, metadata: dict = None):
+    """Write a table to a Parquet file, with JSON metadata in its schema
+
+    The file is written to a temporary name and renamed, so a reader never
+    sees a partial dataset.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           METADATA_KEY: json.dumps(metadata or {}).encode()})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_metadata(path: str):
+    """Metadata stored by `write_dataset`, without reading the rows"""
+    import pyarrow.parquet as pq
+
+    return json.loads((pq.read_schema(path).metadata or {}).get(METADATA_KEY, b'{}'))
+
+
+def read_dataset(path: str, columns=None, filters=None):
+    """Load a dataset, or the columns and rows of it that are needed
+
+    The file is memory-mapped rather than read into buffers, but the selected
+    rows are still decoded into one DataFrame in memory; use `open_dataset`
+    for tables too large for that.
+
+    Args:
+        path (str): Parquet file
+        columns (list): Columns to load, all if None
+        filters (list): Optional row filters pushed down to the reader, e.g.
+            [('observable', '==', 'epidemic_curve'), ('N', '>', 500)]
+
+    Returns:
+        pd.DataFrame: The rows
+    """
+    import pandas as pd
+
+    return pd.read_parquet(path, columns=columns, filters=filters, memory_map=True)
+
+
+def open_dataset(path: str):
+    """Lazy handle on a dataset, for tables too large to load at once
+
+    Nothing is read until it is scanned: e.g. `.to_batches(columns=...,
+    filter=...)` streams the selected rows in record batches of bounded
+    size, and `.count_rows()` reads only the file metadata.
+
+    Returns:
+        pyarrow.dataset.Dataset: The dataset, no row read yet
+    """
+    import pyarrow.dataset as ds
+
+    return ds.dataset(path, format="parquet")
@@ -0,0 +1,209 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import multiprocessing
+
+import numpy as np
+
+from models.SIR import SimulationResult
+from models.cell_list import PeriodicCellList
+from models.neighbor_cache import InfectorCache
+
+# Arrays shared between the tile workers: name -> (dtype, shape given N)
+SHARED_FIELDS = {
+    'positions': (np.float64, lambda N: (N, 2)),
+    'is_superspreader': (np.bool_, lambda N: (N,)),
+    'states': (np.int8, lambda N: (N,)),
+    'infection_times': (np.int32, lambda N: (N,)),
+    'infection_tree': (np.int32, lambda N: (N,)),
+}
+
+
+def tile_grid(n_tiles: int):
+    """Most nearly square (rows, columns) factorization of `n_tiles`"""
+    rows = max(r for r in range(1, int(np.sqrt(n_tiles)) + 1) if n_tiles % r == 0)
+    return rows, n_tiles // rows
+
+
+def tile_ids(positions: np.ndarray, L: float, grid):
+    """Index of the tile containing each point, tiles numbered row by row"""
+    rows, columns = grid
+    row = np.minimum((positions[:, 1] * rows // L).astype(np.int64), rows - 1)
+    column = np.minimum((positions[:, 0] * columns // L).astype(np.int64), columns - 1)
+    return row * columns + column
+
+
+def halo(positions: np.ndarray, L: float, grid, tile: int, width: float):
+    """Points inside a tile or within `width` of it, under periodic boundaries
+
+    Returns:
+        np.ndarray: Sorted indices of the tile's points and of its halo
+    """
+    rows, columns = grid
+    row, column = divmod(tile, columns)
+    squared = np.zeros(len(positions))
+    for axis, (index, count) in enumerate(((column, columns), (row, rows))):
+        size = L / count
+        d = np.abs(positions[:, axis] - (index + 0.5) * size)
+        d = np.minimum(d, L - d)
+        squared += np.maximum(d - size / 2, 0) ** 2
+    return np.flatnonzero(squared <= width ** 2)
+
+
+def _shared_arrays(buffers: dict, N: int):
+    return {name: np.frombuffer(buffers[name], dtype=dtype).reshape(shape(N))
+            for name, (dtype, shape) in SHARED_FIELDS.items()}
+
+
+def _tile_worker(sim, model_type: str, max_steps: int, grid, tile: int, buffers: dict, counts_buffer, N: int,
+                 seed_seq: np.random.SeedSequence, barrier, cache_pairs: int):
+    """Advance the individuals of one tile until the epidemic is over
+
+    Every step is two barrier-separated phases. First each worker reads the
+    states of its tile and halo and decides which of its own susceptibles get
+    infected, with the hazard rule of `SIRSimulation._infect_hazard`. Then,
+    once every worker is done reading, it writes the recoveries and new
+    infections of its own individuals. Workers therefore only ever write
+    their own individuals, and the halo of width max cutoff holds every
+    infector that can reach them.
+    """
+    arrays = _shared_arrays(buffers, N)
+    positions, states = arrays['positions'], arrays['states']
+    counts = np.frombuffer(counts_buffer, dtype=np.int64)
+    n_tiles = grid[0] * grid[1]
+
+    cutoff = sim.kernel(model_type).max_cutoff
+    local = halo(positions, sim.L, grid, tile, cutoff)
+    owned = tile_ids(positions[local], sim.L, grid) == tile
+    local_positions = positions[local]
+    local_superspreader = arrays['is_superspreader'][local]
+    cell_list = PeriodicCellList(local_positions, sim.L, cutoff)
+    cache = InfectorCache(cache_pairs) if sim.gamma < 1 and cache_pairs > 0 else None
+    previous = np.array([], dtype=np.int64)
+
+    for step in range(max_steps):
+        barrier.wait()
+        if counts[:n_tiles].sum() == 0:
+            break
+        if tile == 0:
+            counts[n_tiles] = step + 1
+
+        local_states = states[local]
+        infected = np.flatnonzero(local_states == 1)
+        # Susceptibles of the halo belong to (and are infected by) other tiles
+        local_states[(local_states == 0) & ~owned] = 3
+        if cache is not None:
+            for idx in np.setdiff1d(previous, infected, assume_unique=True):
+                cache.evict(idx)
+            previous = infected
+        rng = np.random.default_rng(
+            np.random.SeedSequence(seed_seq.entropy, spawn_key=seed_seq.spawn_key + (tile, step))
+        )
+        targets, sources = sim._infect_hazard(cell_list, local_positions, local_superspreader, local_states,
+                                              model_type, infected, rng, cache)
+        own_infected = local[infected[owned[infected]]]
+        recovered = own_infected[rng.random(len(own_infected)) < sim.gamma]
+        barrier.wait()
+
+        states[recovered] = 2
+        states[local[targets]] = 1
+        arrays['infection_times'][local[targets]] = step + 1
+        arrays['infection_tree'][local[targets]] = local[sources]
+        counts[tile] += len(targets) - len(recovered)
+
+
+def run_decomposed(sim, N: int, lambda_val: float, model_type: str = 'strong_infectiousness', max_steps: int = 100,
+                   initial_pos=(0, 0), n_workers: int = None, seed: int = 0, cache_pairs: int = 1 << 20):
+    """Run a single epidemic split over worker processes by domain decomposition
+
+    The periodic square is cut into one tile per worker. The population lives
+    in shared memory; each worker owns the individuals of its tile and reads
+    the states of a halo strip as wide as the largest cutoff (rs in the hub
+    model) around it, see `_tile_worker`. Infections follow the "hazard"
+    engine of `SIRSimulation.run_simulation`, so runs have the law of that
+    engine. Each tile draws from its own stream, per step, so a run depends on
+    `seed` and `n_workers` but not on how the processes are scheduled.
+
+    Args:
+        sim (SIRSimulation): Model parameters, typically with a large L
+        N (int): Number of individuals
+        lambda_val (float): Fraction of superspreaders
+        model_type (str): Type of model "hub" or "strong_infectiousness"
+        max_steps (int): Maximum simulation steps
+        initial_pos (tuple): Initial infected position
+        n_workers (int): Number of tiles and worker processes, os.cpu_count() if None
+        seed (int): Root seed
+        cache_pairs (int): Per-worker bound of the InfectorCache used when gamma < 1
+
+    Returns:
+        SimulationResult: Every field except 'front_quantiles'
+    """
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    grid = tile_grid(n_workers)
+
+    context = multiprocessing.get_context()
+    buffers = {name: context.RawArray('b', int(np.dtype(dtype).itemsize * np.prod(shape(N))))
+               for name, (dtype, shape) in SHARED_FIELDS.items()}
+    arrays = _shared_arrays(buffers, N)
+    root = np.random.SeedSequence(seed)
+    positions, is_superspreader, states = sim._initialize(N, lambda_val, initial_pos, np.random.default_rng(root))
+    arrays['positions'][:] = positions
+    arrays['is_superspreader'][:] = is_superspreader
+    arrays['states'][:] = states
+    arrays['infection_times'][:] = -1
+    arrays['infection_times'][0] = 0
+    arrays['infection_tree'][:] = -1
+
+    # Infected individuals per tile, then the number of steps run
+    counts_buffer = context.RawArray('b', 8 * (n_workers + 1))
+    counts = np.frombuffer(counts_buffer, dtype=np.int64)
+    counts[tile_ids(positions[:1], sim.L, grid)[0]] = 1
+
+    barrier = context.Barrier(n_workers)
+    args = (sim, model_type, max_steps, grid)
+    if n_workers == 1:
+        _tile_worker(*args, 0, buffers, counts_buffer, N, root, barrier, cache_pairs)
+    else:
+        workers = [context.Process(target=_tile_worker,
+                                   args=(*args, tile, buffers, counts_buffer, N, root, barrier, cache_pairs))
+                   for tile in range(n_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            # A worker that fails would leave the others waiting at the barrier forever
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=0.1)
+                    if worker.exitcode not in (None, 0):
+                        barrier.abort()
+        except BaseException:
+            barrier.abort()
+            raise
+        finally:
+            for worker in workers:
+                worker.join()
+        if any(worker.exitcode != 0 for worker in workers):
+            raise RuntimeError("A tile worker failed")
+
+    n_steps = int(counts[n_workers])
+    infection_times = arrays['infection_times'].copy()
+    infection_tree = arrays['infection_tree'].copy()
+    infected = infection_times >= 0
+    distances = sim.periodic_distances(np.asarray(initial_pos, dtype=float), positions)
+    # Front before each step: the farthest individual infected up to then
+    front = np.zeros(n_steps + 1)
+    np.maximum.at(front, infection_times[infected], distances[infected])
+    return SimulationResult(
+        n_steps,
+        positions=positions,
+        is_superspreader=is_superspreader,
+        states=arrays['states'].copy(),
+        infection_times=infection_times,
+        infection_tree=infection_tree,
+        secondary_infections=np.bincount(infection_tree[infection_tree >= 0], minlength=N).astype(np.int32),
+        new_infections_per_step=np.bincount(infection_times[infection_times > 0] - 1,
+                                            minlength=n_steps)[:n_steps].astype(np.int32),
+        max_distances=np.maximum.accumulate(front)[:n_steps],
+    )
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class FrontTracker:
+    def __init__(self, origin_distances: np.ndarray, bin_width: float = None):
+        """Running front of a single epidemic
+
+        The distance of every individual from the origin is computed once up
+        front; infections only update a running maximum and, optionally, a
+        radial histogram of the individuals ever infected, so the front never
+        requires a rescan of the infected set.
+
+        Parameters:
+
+            origin_distances (np.ndarray): Periodic distance of every individual
+                from the initial infection, shape (N,)
+            bin_width (float): Width of the radial histogram bins used by
+                `quantile`, None to keep only the maximum
+        """
+        self.origin_distances = origin_distances
+        self.bin_width = bin_width
+        self.max = 0.0
+        self.count = 0
+        self.histogram = None
+        if bin_width is not None:
+            n_bins = int(origin_distances.max(initial=0) // bin_width) + 1
+            self.histogram = np.zeros(n_bins, dtype=np.int64)
+
+    def add(self, indices: np.ndarray):
+        """Record newly infected individuals"""
+        distances = self.origin_distances[indices]
+        if len(distances) == 0:
+            return
+        self.max = max(self.max, float(distances.max()))
+        self.count += len(distances)
+        if self.histogram is not None:
+            np.add.at(self.histogram, (distances // self.bin_width).astype(np.int64), 1)
+
+    def quantile(self, q):
+        """Distance within which a fraction q of the individuals ever infected lie
+
+        Resolved to the upper edge of a histogram bin, so it overestimates by
+        less than bin_width; q = 1 gives the exact maximum.
+
+        Args:
+            q (float or np.ndarray): Fraction(s) in [0, 1]
+
+        Returns:
+            float or np.ndarray: Front distance(s)
+        """
+        if self.histogram is None:
+            raise ValueError("FrontTracker was created without a radial histogram (bin_width=None)")
+        cumulative = np.cumsum(self.histogram)
+        bins = np.searchsorted(cumulative, np.asarray(q) * self.count)
+        return np.minimum((bins + 1) * self.bin_width, self.max)
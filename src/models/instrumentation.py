@@ -0,0 +1,79 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+# Counters every engine reports, in export order
+COUNTERS = {
+    'runs': "Simulated runs",
+    'steps': "Steps executed, summed over runs",
+    'pairs_evaluated': "Infector-target distances computed",
+    'pairs_in_range': "Infector-target pairs with a nonzero infection probability",
+    'rng_draws': "Uniform draws of the infection and recovery processes",
+}
+# Phases timed by run_simulation and run_ensemble
+PHASES = ('infection', 'recovery', 'front', 'results')
+
+_DISABLED = nullcontext()
+
+
+class Instrumentation:
+    def __init__(self):
+        """Opt-in counters and per-phase wall-clock timers of the simulation engines
+
+        Engines take an optional `instrumentation` argument and skip all
+        bookkeeping when it is None. Pass a fresh instance to collect one run
+        (or one batch), and `merge` instances to aggregate a sweep; instances
+        are picklable, so worker processes can send theirs back.
+        """
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.timers = dict.fromkeys(PHASES, 0.0)
+
+    def count(self, name: str, n: int = 1):
+        """Add `n` to a counter"""
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Context manager adding its wall-clock duration to the timer of a phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0.0) + time.perf_counter() - start
+
+    def merge(self, other: "Instrumentation"):
+        """Add the counters and timers of another instance"""
+        for name, value in other.counters.items():
+            self.count(name, value)
+        for name, seconds in other.timers.items():
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+        return self
+
+    def to_dict(self):
+        return {'counters': dict(self.counters), 'timers': dict(self.timers)}
+
+    def to_json(self, indent: int = 2):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self, prefix: str = 'sir'):
+        """Counters and timers in the Prometheus text exposition format"""
+        lines = []
+        for name, value in self.counters.items():
+            lines += [f"# HELP {prefix}_{name}_total {COUNTERS.get(name, name)}",
+                      f"# TYPE {prefix}_{name}_total counter",
+                      f"{prefix}_{name}_total {value}"]
+        lines += [f"# HELP {prefix}_phase_seconds_total Wall-clock time spent in each engine phase",
+                  f"# TYPE {prefix}_phase_seconds_total counter"]
+        lines += [f'{prefix}_phase_seconds_total{{phase="{name}"}} {seconds:.9f}'
+                  for name, seconds in self.timers.items()]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Write to `path`, in the Prometheus format if it ends in .prom and as JSON otherwise"""
+        with open(path, "w") as f:
+            f.write(self.to_prometheus() if path.endswith(".prom") else self.to_json())
+
+
+def phase(instrumentation: Instrumentation, name: str):
+    """Timer of a phase, or a shared no-op context when instrumentation is disabled"""
+    return _DISABLED if instrumentation is None else instrumentation.phase(name)
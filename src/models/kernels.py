@@ -0,0 +1,118 @@
+import numpy as np
+
+
+class InfectionKernel:
+    def __init__(self, w0: float, r0: float, alpha: float, superspreader_cutoff: float, superspreader_decays: bool,
+                 table_size: int = None):
+        """Distance dependence of the infection probability, for arrays of pairs
+
+        A normal infector at distance r infects with probability
+        w0 * (1 - r/r0)**alpha within r0. A superspreader infects within
+        `superspreader_cutoff`, either with the same decaying profile over its
+        own cutoff or with the flat probability w0.
+
+        Kernels take squared distances. Pairs beyond the cutoff are rejected on
+        the squared distance, so the square root and the power are only
+        evaluated for pairs in range, which are few in a dense pair matrix.
+
+        Parameters:
+
+            w0 (float): Infection probability at zero distance
+            r0 (float): Cutoff distance of normal individuals
+            alpha (float): Exponent of the distance decay
+            superspreader_cutoff (float): Cutoff distance of superspreaders
+            superspreader_decays (bool): True if superspreaders follow the
+                decaying profile, False for a flat w0 within their cutoff
+            table_size (int): If given, the decay is read from a table of this
+                many points, uniform in r²/cutoff², by linear interpolation
+                instead of being evaluated. This avoids the square root and
+                the power entirely, at an absolute error below
+                alpha / sqrt(table_size) right next to the infector and much
+                less elsewhere.
+        """
+        self.w0 = w0
+        self.r0 = r0
+        self.alpha = alpha
+        self.superspreader_cutoff = superspreader_cutoff
+        self.superspreader_decays = superspreader_decays
+        self.table_size = table_size
+        self._table = None
+        if table_size is not None:
+            grid = np.linspace(0, 1, table_size)
+            self._table = (grid, w0 * (1 - np.sqrt(grid))**alpha)
+
+    def tabulated(self, table_size: int = 1 << 16):
+        """Copy of this kernel using a lookup table of `table_size` points"""
+        return InfectionKernel(self.w0, self.r0, self.alpha, self.superspreader_cutoff, self.superspreader_decays,
+                               table_size)
+
+    @property
+    def max_cutoff(self):
+        """Distance beyond which no infector can infect"""
+        return max(self.r0, self.superspreader_cutoff)
+
+    def cutoff(self, is_superspreader: bool):
+        """Distance beyond which an individual cannot infect anyone"""
+        return self.superspreader_cutoff if is_superspreader else self.r0
+
+    def _decay(self, r2: np.ndarray, cutoff: np.ndarray):
+        """w0 * (1 - r/cutoff)**alpha for squared distances within the cutoff"""
+        if self._table is not None:
+            return np.interp(r2 / cutoff**2, *self._table)
+        return self.w0 * (1 - np.sqrt(r2) / cutoff)**self.alpha
+
+    def __call__(self, r2: np.ndarray, is_superspreader: np.ndarray):
+        """Infection probabilities of pairs
+
+        Args:
+            r2 (np.ndarray): Squared distances between infectors and targets
+            is_superspreader (np.ndarray): True where the infector is a
+                superspreader, broadcast against r2
+
+        Returns:
+            np.ndarray: Infection probabilities, shaped like the broadcast inputs
+        """
+        r2, is_superspreader = np.broadcast_arrays(np.asarray(r2, dtype=float), is_superspreader)
+        cutoff = np.where(is_superspreader, self.superspreader_cutoff, self.r0)
+        probs = np.zeros(r2.shape)
+        in_range = r2 <= cutoff**2
+        values = self._decay(r2[in_range], cutoff[in_range])
+        if not self.superspreader_decays:
+            values = np.where(is_superspreader[in_range], self.w0, values)
+        probs[in_range] = values
+        return probs
+
+
+class StrongInfectiousnessKernel(InfectionKernel):
+    def __init__(self, w0: float, r0: float, alpha: float = 2, table_size: int = None):
+        """Strong infectiousness model: superspreaders infect with w0 anywhere within r0
+
+        Parameters:
+
+            w0 (float): Infection probability at zero distance
+            r0 (float): Cutoff distance
+            alpha (float): Exponent of the distance decay of normal individuals
+            table_size (int): Optional lookup table size, see InfectionKernel
+        """
+        super().__init__(w0, r0, alpha, r0, False, table_size)
+
+    def tabulated(self, table_size: int = 1 << 16):
+        return StrongInfectiousnessKernel(self.w0, self.r0, self.alpha, table_size)
+
+
+class HubKernel(InfectionKernel):
+    def __init__(self, w0: float, r0: float, rs: float, alpha: float = 2, table_size: int = None):
+        """Hub model: superspreaders follow the normal profile over the longer range rs
+
+        Parameters:
+
+            w0 (float): Infection probability at zero distance
+            r0 (float): Cutoff distance of normal individuals
+            rs (float): Cutoff distance of superspreaders
+            alpha (float): Exponent of the distance decay
+            table_size (int): Optional lookup table size, see InfectionKernel
+        """
+        super().__init__(w0, r0, alpha, rs, True, table_size)
+
+    def tabulated(self, table_size: int = 1 << 16):
+        return HubKernel(self.w0, self.r0, self.superspreader_cutoff, self.alpha, table_size)
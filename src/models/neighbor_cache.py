@@ -0,0 +1,51 @@
+import numpy as np
+
+
+class InfectorCache:
+    def __init__(self, max_pairs: int = 1 << 20):
+        """In-range susceptible neighbors of the current infectors and their infection probabilities
+
+        With gamma < 1 an individual stays infectious for several steps, and its
+        neighbors and their distances do not change in between. Entries are
+        pruned to the still-susceptible targets whenever they are read, dropped
+        when their infector recovers, and new entries are refused once the
+        cached (infector, target) pairs would exceed `max_pairs`; those
+        infectors are simply recomputed every step.
+
+        Parameters:
+
+            max_pairs (int): Bound on the number of cached pairs
+        """
+        self.max_pairs = max_pairs
+        self.n_pairs = 0
+        self._entries = {}
+
+    def get(self, infector_idx: int, states: np.ndarray):
+        """Cached targets of an infector, restricted to those still susceptible
+
+        Returns:
+            tuple: (targets, probabilities), or None if the infector is not cached
+        """
+        entry = self._entries.get(infector_idx)
+        if entry is None:
+            return None
+        targets, probs = entry
+        susceptible = states[targets] == 0
+        if not susceptible.all():
+            self.n_pairs -= len(targets) - np.count_nonzero(susceptible)
+            targets, probs = targets[susceptible], probs[susceptible]
+            self._entries[infector_idx] = (targets, probs)
+        return targets, probs
+
+    def put(self, infector_idx: int, targets: np.ndarray, probs: np.ndarray):
+        """Cache the targets of an infector, unless the cache is full"""
+        if self.n_pairs + len(targets) > self.max_pairs:
+            return
+        self._entries[infector_idx] = (targets, probs)
+        self.n_pairs += len(targets)
+
+    def evict(self, infector_idx: int):
+        """Drop the entry of an infector that recovered"""
+        entry = self._entries.pop(infector_idx, None)
+        if entry is not None:
+            self.n_pairs -= len(entry[0])
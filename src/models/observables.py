@@ -0,0 +1,162 @@
+import numpy as np
+
+from models.accumulators import BinnedQuantiles, IntegerHistogram, MeanVariance, Samples, ThresholdCount
+from models.analytics import CURVE_STATISTICS, curve_statistics, front_velocities, replica_summary, stack_statistics
+
+# New infections per step, mean and std over runs
+EPIDEMIC_CURVE = 'epidemic_curve'
+# Distance of the infected front from the origin per step, mean and std over runs
+FRONT_CURVE = 'front_curve'
+# Histogram of secondary infections over every individual ever infected
+SECONDARY_HISTOGRAM = 'secondary_histogram'
+# Slope of the front distance over the first 5 steps, mean over runs with its
+# bootstrap 95% confidence interval
+FRONT_VELOCITY = 'front_velocity'
+# Peak, width, asymmetry and final size of the epidemic curve of every run
+EPIDEMIC_STATISTICS = 'epidemic_statistics'
+# Quantiles over runs of the fraction of individuals ever infected
+FINAL_SIZE_QUANTILES = 'final_size_quantiles'
+
+# Levels of the quantile observables, summarized as fields 'q05', 'q25', ...
+QUANTILE_LEVELS = (0.05, 0.25, 0.5, 0.75, 0.95)
+QUANTILE_FIELDS = tuple(f'q{round(100 * q):02d}' for q in QUANTILE_LEVELS)
+# Bins of the quantile accumulators, over the range of their values
+QUANTILE_BINS = 500
+
+
+def percolation(threshold: float):
+    """Name of the observable counting runs whose front reaches `threshold`"""
+    return f'percolation@{threshold:g}'
+
+
+def percolation_threshold(observable: str):
+    """Threshold of a percolation observable, None for any other observable"""
+    if observable.startswith('percolation@'):
+        return float(observable.split('@', 1)[1])
+    return None
+
+
+def front_quantiles(max_distance: float):
+    """Name of the observable holding quantiles over runs of the front distance per step
+
+    Args:
+        max_distance (float): Largest front distance binned, e.g. L / sqrt(2) in
+            a periodic square of side L; farther fronts count as this distance
+    """
+    return f'front_quantiles@{max_distance:g}'
+
+
+def front_quantiles_range(observable: str):
+    """Largest front distance of a front quantile observable, None for any other observable"""
+    if observable.startswith('front_quantiles@'):
+        return float(observable.split('@', 1)[1])
+    return None
+
+
+def stopping_threshold(observables):
+    """Front distance after which a run can stop without changing any of the observables
+
+    Returns:
+        float: Largest percolation threshold if every observable is a percolation
+            count, None if some observable needs the full epidemic
+    """
+    thresholds = [percolation_threshold(observable) for observable in observables]
+    if not thresholds or any(threshold is None for threshold in thresholds):
+        return None
+    return max(thresholds)
+
+
+def per_run(result: dict, observable: str):
+    """Reduce a batch of `run_ensemble` results to what an observable needs
+
+    The returned arrays have one leading entry per run (or per infected
+    individual for histograms), ready to be folded into `accumulator`.
+
+    Args:
+        result (dict): Stacked results of `SIRSimulation.run_ensemble`
+        observable (str): Observable name
+
+    Returns:
+        np.ndarray: Per-run values
+    """
+    if observable == EPIDEMIC_CURVE:
+        return result['new_infections_per_step']
+    if observable == FRONT_CURVE:
+        return result['max_distances']
+    if observable == SECONDARY_HISTOGRAM:
+        return result['secondary_infections'][result['states'] > 0]
+    if observable == FRONT_VELOCITY:
+        return front_velocities(result['max_distances'], result['n_steps'])
+    if observable == EPIDEMIC_STATISTICS:
+        return stack_statistics(curve_statistics(result['new_infections_per_step']))
+    if observable == FINAL_SIZE_QUANTILES:
+        return (result['states'] > 0).mean(axis=1)
+    if front_quantiles_range(observable) is not None:
+        return result['max_distances']
+    if percolation_threshold(observable) is not None:
+        return result['max_distances'].max(axis=1)
+    raise ValueError(f"Unknown observable: {observable}")
+
+
+def accumulator(observable: str):
+    """Empty streaming accumulator of an observable, see `models.accumulators`"""
+    if observable in (EPIDEMIC_CURVE, FRONT_CURVE):
+        return MeanVariance()
+    if observable in (FRONT_VELOCITY, EPIDEMIC_STATISTICS):
+        return Samples()
+    if observable == SECONDARY_HISTOGRAM:
+        return IntegerHistogram()
+    if observable == FINAL_SIZE_QUANTILES:
+        return BinnedQuantiles(np.linspace(0, 1, QUANTILE_BINS + 1))
+    max_distance = front_quantiles_range(observable)
+    if max_distance is not None:
+        return BinnedQuantiles(np.linspace(0, max_distance, QUANTILE_BINS + 1))
+    threshold = percolation_threshold(observable)
+    if threshold is not None:
+        return ThresholdCount(threshold)
+    raise ValueError(f"Unknown observable: {observable}")
+
+
+def accumulate(result: dict, observable: str):
+    """Accumulator of an observable holding a batch of `run_ensemble` results
+
+    Accumulators of different batches of the same scenario merge, so runs
+    are folded in batch by batch and never kept.
+    """
+    values = per_run(result, observable)
+    if observable == FRONT_VELOCITY:
+        values = values[~np.isnan(values)]
+    return accumulator(observable).add(values)
+
+
+def summarize(accumulated, observable: str):
+    """Aggregate an observable from its accumulator
+
+    Args:
+        accumulated: Accumulator of the observable over all runs, see `accumulate`
+        observable (str): Observable name
+
+    Returns:
+        dict: Named arrays; 'mean'/'std' for curves, 'counts' for histograms,
+            'mean'/'count'/'ci_lower'/'ci_upper' for the velocity, 'count'/'n_runs' for percolation,
+            one array per run for each of `models.analytics.CURVE_STATISTICS`
+            and QUANTILE_FIELDS for quantile observables, per step for the front
+    """
+    if observable in (EPIDEMIC_CURVE, FRONT_CURVE):
+        return {'mean': accumulated.mean, 'std': accumulated.std}
+    if observable == SECONDARY_HISTOGRAM:
+        return {'counts': accumulated.counts}
+    if observable == EPIDEMIC_STATISTICS:
+        return {name: accumulated.values[:, i] for i, name in enumerate(CURVE_STATISTICS)}
+    if observable == FRONT_VELOCITY:
+        if not accumulated.count:
+            return {'mean': np.array(0.0), 'count': np.array(0), 'ci_lower': np.array(np.nan),
+                    'ci_upper': np.array(np.nan)}
+        summary = replica_summary(accumulated.values)
+        return {'mean': np.array(summary['value']), 'count': np.array(accumulated.count),
+                'ci_lower': np.array(summary['ci'][0]), 'ci_upper': np.array(summary['ci'][1])}
+    if observable == FINAL_SIZE_QUANTILES or front_quantiles_range(observable) is not None:
+        return {field: np.asarray(accumulated.quantile(q)) for field, q in zip(QUANTILE_FIELDS, QUANTILE_LEVELS)}
+    if percolation_threshold(observable) is not None:
+        return {'count': np.array(accumulated.count), 'n_runs': np.array(accumulated.n)}
+    raise ValueError(f"Unknown observable: {observable}")
@@ -0,0 +1,111 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from models.runner import normalize_scenario, run_observables
+
+
+def sim_key(sim):
+    """Model parameters that distinguish two SIRSimulation instances"""
+    return tuple(float(getattr(sim, name)) for name in ('r0', 'w0', 'gamma', 'alpha', 'L'))
+
+
+class SimulationPlan:
+    def __init__(self):
+        """Declarative list of the simulations several consumers need
+
+        Each consumer (typically a figure) registers (sim, scenario, observables)
+        requests. Identical scenarios of identical models are merged, with the
+        union of their observables, so each distinct scenario is simulated once
+        and its summary is handed to every consumer that asked for it.
+        """
+        self._consumers = {}
+        self._sims = {}
+
+    def add(self, name: str, requests):
+        """Register the requests of a consumer
+
+        Args:
+            name (str): Consumer name, used to retrieve its results
+            requests (list): (sim, scenario, observables) triples
+        """
+        entries = []
+        for sim, scenario, observables in requests:
+            key = sim_key(sim)
+            self._sims.setdefault(key, sim)
+            entries.append((key, normalize_scenario(scenario), tuple(observables)))
+        self._consumers[name] = entries
+
+    def unique_requests(self):
+        """Merged requests
+
+        Returns:
+            dict: {(sim_key, scenario): observables} with each distinct scenario once
+        """
+        merged = {}
+        for entries in self._consumers.values():
+            for key, scenario, observables in entries:
+                merged.setdefault((key, scenario), {}).update(dict.fromkeys(observables))
+        return {request: tuple(observables) for request, observables in merged.items()}
+
+    def volume(self):
+        """Number of simulated runs without and with de-duplication
+
+        With adaptive sampling these are upper bounds for percolation-only scenarios.
+
+        Returns:
+            tuple: (requested runs, unique runs)
+        """
+        requested = sum(scenario.n_runs for entries in self._consumers.values() for _, scenario, _ in entries)
+        unique = sum(scenario.n_runs for _, scenario in self.unique_requests())
+        return requested, unique
+
+    def run(self, seed: int = 0, n_workers: int = None, cache=None, chunk_size: int = 50, sampling=None,
+            engine: str = 'ensemble', instrumentation=None, checkpoint=None):
+        """Simulate every distinct scenario once
+
+        Args:
+            seed (int): Root seed
+            n_workers (int): Number of worker processes, os.cpu_count() if None
+            cache (ResultCache): Result cache consulted before simulating, if any
+            chunk_size (int): Replicas per task
+            sampling (AdaptiveSampling): Optional sequential sampling rule for
+                percolation-only scenarios, see `models.runner.run_observables`
+            engine (str): "ensemble" or "graph", see `models.runner.run_scenarios`
+            instrumentation (Instrumentation): Optional aggregate of the engine
+                counters and timers, see `models.runner.run_observables`
+            checkpoint (SweepCheckpoint): Optional store of partial results the
+                scenarios resume from, see `models.runner.run_observables`
+
+        Returns:
+            dict: {consumer name: list of summaries aligned with its requests}
+        """
+        unique = self.unique_requests()
+        summaries = {}
+        for key, sim in self._sims.items():
+            requests = [(scenario, observables) for (k, scenario), observables in unique.items() if k == key]
+            results = run_observables(sim, requests, seed, n_workers, chunk_size,
+                                      desc='Simulating scenarios', cache=cache, sampling=sampling,
+                                      engine=engine, instrumentation=instrumentation, checkpoint=checkpoint)
+            for (scenario, _), summary in zip(requests, results):
+                summaries[key, scenario] = summary
+
+        return {
+            name: [{observable: summaries[key, scenario][observable] for observable in observables}
+                   for key, scenario, observables in entries]
+            for name, entries in self._consumers.items()
+        }
+
+
+def run_requests(requests, seed: int = 0, n_workers: int = None, cache=None, sampling=None, engine: str = 'ensemble',
+                 instrumentation=None, checkpoint=None):
+    """Run the (sim, scenario, observables) requests of a single consumer
+
+    Returns:
+        list: One summary per request, in order
+    """
+    plan = SimulationPlan()
+    plan.add('requests', requests)
+    return plan.run(seed, n_workers, cache, sampling=sampling, engine=engine,
+                    instrumentation=instrumentation, checkpoint=checkpoint)['requests']
@@ -0,0 +1,374 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import zlib
+import itertools
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from models.SIR import ENGINE_VERSION, GRAPH_ENGINE_VERSION
+from models.observables import accumulate, stopping_threshold, summarize
+from models.sampling import AdaptiveSampling
+from models.instrumentation import Instrumentation
+
+
+class Scenario(NamedTuple):
+    """One Monte Carlo configuration of the SIR model
+
+    Attributes:
+        N (int): Number of individuals
+        lambda_val (float): Fraction of superspreaders
+        model_type (str): Type of model "hub" or "strong_infectiousness"
+        n_runs (int): Number of independent replicas
+        max_steps (int): Maximum simulation steps
+        initial_pos (tuple): Initial infected position
+    """
+    N: int
+    lambda_val: float
+    model_type: str = 'strong_infectiousness'
+    n_runs: int = 1000
+    max_steps: int = 100
+    initial_pos: tuple = (0, 0)
+
+
+def normalize_scenario(scenario: Scenario):
+    """Convert the fields of a scenario to plain Python types
+
+    Scenarios built from NumPy scalars then compare, hash and seed exactly
+    like the equivalent scenario built from literals.
+    """
+    return Scenario(
+        N=int(scenario.N),
+        lambda_val=float(scenario.lambda_val),
+        model_type=str(scenario.model_type),
+        n_runs=int(scenario.n_runs),
+        max_steps=int(scenario.max_steps),
+        initial_pos=tuple(float(x) for x in scenario.initial_pos),
+    )
+
+
+def scenario_grid(N_values, lambda_values, model_types, n_runs=1000, max_steps=100, initial_pos=(0, 0)):
+    """Build the scenarios of a full parameter grid
+
+    Returns:
+        list: One Scenario per (model_type, lambda_val, N) combination
+    """
+    return [
+        Scenario(N, lambda_val, model_type, n_runs, max_steps, initial_pos)
+        for model_type, lambda_val, N in itertools.product(model_types, lambda_values, N_values)
+    ]
+
+
+def scenario_seed(scenario: Scenario, seed: int):
+    """Seed sequence of a scenario, derived from the root seed and the scenario itself
+
+    The stream does not depend on which other scenarios are simulated alongside,
+    so a scenario gives the same results in every sweep that contains it.
+    """
+    key = zlib.crc32(repr(tuple(normalize_scenario(scenario))).encode())
+    return np.random.SeedSequence(seed, spawn_key=(key,))
+
+
+def population_key(scenario: Scenario):
+    """Fields of a scenario that determine its population draws under the graph engine
+
+    Scenarios that differ only in lambda_val and model_type share their
+    populations (and random numbers) when simulated by `run_coupled`.
+    """
+    scenario = normalize_scenario(scenario)
+    return scenario.N, scenario.n_runs, scenario.max_steps, scenario.initial_pos
+
+
+def population_seed(scenario: Scenario, seed: int):
+    """Seed sequence of the populations shared by every scenario with the same `population_key`
+
+    As with `scenario_seed`, a scenario's results do not depend on which other
+    scenarios are simulated alongside it.
+    """
+    key = zlib.crc32(repr(('population',) + population_key(scenario)).encode())
+    return np.random.SeedSequence(seed, spawn_key=(key,))
+
+
+def _run_chunk(sim, scenarios, n_runs: int, seed_seq: np.random.SeedSequence, observables=None,
+               engine: str = 'ensemble', instrument: bool = False):
+    """Run one chunk of replicas with its own random stream
+
+    The "ensemble" engine runs a single scenario. The "graph" engine runs a
+    group of scenarios with the same `population_key` on shared populations.
+
+    Returns:
+        tuple: (results, instrumentation) one result per scenario, and the
+            chunk's Instrumentation if `instrument` is set, None otherwise
+    """
+    rng = np.random.default_rng(seed_seq)
+    instrumentation = Instrumentation() if instrument else None
+    observables = [None] * len(scenarios) if observables is None else observables
+    # Percolation-only requests stop each replica once its front crosses the threshold
+    front_thresholds = [None if obs is None else stopping_threshold(obs) for obs in observables]
+    if engine == 'ensemble':
+        (scenario,) = scenarios
+        results = [sim.run_ensemble(scenario.N, scenario.lambda_val, scenario.model_type, n_runs,
+                                    scenario.max_steps, scenario.initial_pos, rng=rng,
+                                    front_threshold=front_thresholds[0], instrumentation=instrumentation)]
+    else:
+        first = scenarios[0]
+        results = sim.run_coupled(first.N, [(s.lambda_val, s.model_type) for s in scenarios], n_runs,
+                                  first.max_steps, first.initial_pos, rng=rng, front_thresholds=front_thresholds,
+                                  instrumentation=instrumentation)
+    # Only ship back the accumulated observables, not the runs
+    return [result if obs is None else {observable: accumulate(result, observable) for observable in obs}
+            for result, obs in zip(results, observables)], instrumentation
+
+
+def run_scenarios(sim, scenarios, seed: int = 0, n_workers: int = None, chunk_size: int = 50, desc: str = None,
+                  observables=None, run_ranges=None, engine: str = 'ensemble', instrumentation=None, initial=None,
+                  on_chunk=None):
+    """Run the replicas of many scenarios, spread over a process pool
+
+    The replicas of every scenario are split into chunks of `chunk_size`, and
+    chunk i draws from the i-th child of the scenario's seed sequence. Since the
+    chunking does not depend on the number of workers, results are
+    bit-identical for a given seed however many workers are used.
+
+    With the "graph" engine, scenarios sharing a `population_key` (and run
+    range) are simulated together by `SIRSimulation.run_coupled`, chunk i
+    drawing from the i-th child of their `population_seed`.
+
+    Args:
+        sim (SIRSimulation): Model parameters shared by all scenarios
+        scenarios (list): Scenarios to simulate
+        seed (int): Root seed
+        n_workers (int): Number of worker processes, os.cpu_count() if None.
+            With a single worker everything runs in the calling process.
+        chunk_size (int): Replicas per task
+        desc (str): Progress bar label
+        observables (list): Optional observables to accumulate per scenario (one
+            collection per scenario); see `models.observables.accumulate`
+        run_ranges (list): Optional (start, stop) replica range per scenario,
+            with start a multiple of `chunk_size`. Runs [start, stop) are the
+            same replicas a full run of the scenario would produce, so a
+            scenario can be extended batch by batch.
+        engine (str): "ensemble" for independent `run_ensemble` replicas per
+            scenario, "graph" for `run_coupled` on populations shared across
+            superspreader fractions and models
+        instrumentation (Instrumentation): Optional aggregate the counters and
+            timers of every chunk are merged into, see `models.instrumentation`
+        initial (list): Optional accumulators per scenario (or None) of the runs
+            before its run range, which its chunks are merged into, e.g. to
+            resume a checkpointed scenario
+        on_chunk (callable): Optional on_chunk(scenario index, runs done,
+            accumulators) called whenever a chunk has been merged
+
+    Returns:
+        list: One dict of stacked `run_ensemble` results per scenario, in order,
+            or of observable accumulators if `observables` is given. The
+            accumulators of the chunks are merged in chunk order as they arrive.
+    """
+    scenarios = [normalize_scenario(s) for s in scenarios]
+    if run_ranges is None:
+        run_ranges = [(0, scenario.n_runs) for scenario in scenarios]
+    if engine == 'ensemble':
+        groups = {scenario_idx: [scenario_idx] for scenario_idx in range(len(scenarios))}
+        group_seed = scenario_seed
+    elif engine == 'graph':
+        groups = {}
+        for scenario_idx, (scenario, run_range) in enumerate(zip(scenarios, run_ranges)):
+            groups.setdefault((population_key(scenario), tuple(run_range)), []).append(scenario_idx)
+        group_seed = population_seed
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+
+    tasks = []
+    for indices in groups.values():
+        start, stop = run_ranges[indices[0]]
+        if start >= stop:
+            continue
+        if start % chunk_size:
+            raise ValueError(f"Run range must start at a multiple of chunk_size={chunk_size}, got {start}")
+        root = group_seed(scenarios[indices[0]], seed)
+        group_observables = None if observables is None else [tuple(observables[i]) for i in indices]
+        for chunk_idx in range(start // chunk_size, -(-stop // chunk_size)):
+            # Same stream as the chunk_idx-th child of root.spawn()
+            seed_seq = np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (chunk_idx,))
+            n_runs = min(chunk_size, stop - chunk_idx * chunk_size)
+            tasks.append((indices, chunk_idx * chunk_size + n_runs, (sim, [scenarios[i] for i in indices], n_runs, seed_seq, group_observables,
+                                    engine, instrumentation is not None)))
+
+    parts = [[] for _ in scenarios]
+    accumulated = [None] * len(scenarios) if initial is None else list(initial)
+
+    def collect(indices, n_done, chunk):
+        chunk, chunk_instrumentation = chunk
+        if chunk_instrumentation is not None:
+            instrumentation.merge(chunk_instrumentation)
+        for scenario_idx, result in zip(indices, chunk):
+            if observables is None:
+                parts[scenario_idx].append(result)
+            elif accumulated[scenario_idx] is None:
+                accumulated[scenario_idx] = result
+            else:
+                for observable, value in result.items():
+                    accumulated[scenario_idx][observable].merge(value)
+            if on_chunk is not None and observables is not None:
+                on_chunk(scenario_idx, n_done, accumulated[scenario_idx])
+
+    # Imported here so that worker processes, which only run _run_chunk, never load it
+    from tqdm import tqdm
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    progress = tqdm(total=len(tasks), desc=desc, disable=desc is None)
+    if n_workers <= 1:
+        for indices, n_done, args in tasks:
+            collect(indices, n_done, _run_chunk(*args))
+            progress.update()
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(_run_chunk, *args) for _, _, args in tasks]
+            for (indices, n_done, _), future in zip(tasks, futures):
+                collect(indices, n_done, future.result())
+                progress.update()
+    progress.close()
+
+    if observables is not None:
+        return accumulated
+    return [{key: np.concatenate([part[key] for part in scenario_parts]) for key in scenario_parts[0]}
+            for scenario_parts in parts]
+
+
+def _run_adaptive(sim, requests, seed: int, n_workers: int, chunk_size: int, desc: str, sampling: AdaptiveSampling,
+                  engine: str = 'ensemble', instrumentation=None, initial=None, on_round=None):
+    """Observable accumulators of percolation-only requests, sampled until their intervals are narrow enough
+
+    Every round extends the unfinished scenarios by `sampling.batch_size` runs.
+    The runs of a scenario are always a prefix of its fixed-size run, so a
+    scenario that hits its cap gives exactly the fixed-size result.
+
+    `initial` optionally gives, per request, the (runs done, accumulators) to
+    resume from, and on_round(request index, runs done, accumulators) is
+    called after every round that extended a request.
+    """
+    if sampling.batch_size % chunk_size:
+        raise ValueError(f"batch_size={sampling.batch_size} must be a multiple of chunk_size={chunk_size}")
+    accumulated = [None] * len(requests)
+    n_done = [0] * len(requests)
+    for i, state in enumerate(initial or ()):
+        if state is not None:
+            n_done[i], accumulated[i] = state
+
+    def finished(i):
+        if n_done[i] >= requests[i][0].n_runs:
+            return True
+        counts = [accumulated[i][observable].count for observable in requests[i][1]]
+        return sampling.converged(counts, n_done[i])
+
+    pending = [i for i in range(len(requests)) if accumulated[i] is None or not finished(i)]
+
+    while pending:
+        run_ranges = [(n_done[i], min(n_done[i] + sampling.batch_size, requests[i][0].n_runs)) for i in pending]
+        batch = run_scenarios(sim, [requests[i][0] for i in pending], seed, n_workers, chunk_size,
+                              None if desc is None else f"{desc} ({len(pending)} adaptive)",
+                              observables=[requests[i][1] for i in pending], run_ranges=run_ranges, engine=engine,
+                              instrumentation=instrumentation)
+        for i, (_, stop), scenario_accumulated in zip(pending, run_ranges, batch):
+            if accumulated[i] is None:
+                accumulated[i] = scenario_accumulated
+            else:
+                for observable, value in scenario_accumulated.items():
+                    accumulated[i][observable].merge(value)
+            n_done[i] = stop
+            if on_round is not None:
+                on_round(i, stop, accumulated[i])
+
+        pending = [i for i in pending if not finished(i)]
+
+    return accumulated
+
+
+def run_observables(sim, requests, seed: int = 0, n_workers: int = None, chunk_size: int = 50, desc: str = None,
+                    cache=None, sampling: AdaptiveSampling = None, engine: str = 'ensemble', instrumentation=None,
+                    checkpoint=None):
+    """Compute aggregated observables of many scenarios, reusing cached results
+
+    Args:
+        sim (SIRSimulation): Model parameters shared by all scenarios
+        requests (list): (scenario, observables) pairs
+        seed (int): Root seed
+        n_workers (int): Number of worker processes, os.cpu_count() if None
+        chunk_size (int): Replicas per task
+        desc (str): Progress bar label
+        cache (ResultCache): Result cache consulted before simulating, if any
+        sampling (AdaptiveSampling): Optional sequential sampling rule for
+            percolation-only requests, whose n_runs then becomes a cap. Other
+            requests always use their full n_runs.
+        engine (str): "ensemble" or "graph", see `run_scenarios`
+        instrumentation (Instrumentation): Optional aggregate of the engine
+            counters and timers of the simulated (not cached) runs
+        checkpoint (SweepCheckpoint): Optional store of the partial results of
+            the simulated scenarios. Scenarios resume from their checkpoint,
+            whose cells are discarded once every summary is computed; see
+            `models.checkpoint`
+
+    Returns:
+        list: One {observable: {field: array}} summary per request, in order;
+            see `models.observables.summarize`
+    """
+    summaries = []
+    missing = []
+    for request_idx, (scenario, observables) in enumerate(requests):
+        scenario = normalize_scenario(scenario)
+        threshold = stopping_threshold(observables)
+        adaptive = sampling is not None and threshold is not None
+        # Early-stopped runs consume the random stream differently from full runs
+        version = ENGINE_VERSION if engine == 'ensemble' else GRAPH_ENGINE_VERSION
+        tag = f"{version}/chunk{chunk_size}/stop{threshold}/sampling{tuple(sampling) if adaptive else None}"
+        key = cache.key(sim, scenario, seed, tag) if cache is not None else None
+        summary = (cache.get(key) if cache is not None else None) or {}
+        todo = list(dict.fromkeys(observables))
+        if any(observable not in summary for observable in todo):
+            cell = checkpoint.key(sim, scenario, seed, tag, todo) if checkpoint is not None else None
+            missing.append((request_idx, scenario, todo, key, adaptive, cell))
+        summaries.append(summary)
+
+    if missing:
+        fixed = [entry for entry in missing if not entry[4]]
+        adaptive = [entry for entry in missing if entry[4]]
+        resumed = {cell: checkpoint.load(cell) for *_, cell in missing if checkpoint is not None}
+
+        def progress(entries):
+            """Callback recording the partial results of entries[i] in the checkpoint"""
+            if checkpoint is None:
+                return None
+            return lambda i, n_done, accumulators: checkpoint.update(entries[i][5], n_done, accumulators)
+
+        accumulated = []
+        if fixed:
+            states = [resumed.get(cell) for *_, cell in fixed]
+            accumulated += run_scenarios(
+                sim, [scenario for _, scenario, _, _, _, _ in fixed], seed, n_workers, chunk_size, desc,
+                observables=[todo for _, _, todo, _, _, _ in fixed],
+                run_ranges=[(0 if state is None else state[0], scenario.n_runs)
+                            for (_, scenario, *_), state in zip(fixed, states)],
+                engine=engine, instrumentation=instrumentation,
+                initial=[None if state is None else state[1] for state in states], on_chunk=progress(fixed)
+            )
+        if adaptive:
+            accumulated += _run_adaptive(
+                sim, [(scenario, todo) for _, scenario, todo, _, _, _ in adaptive], seed, n_workers, chunk_size, desc,
+                sampling, engine, instrumentation, initial=[resumed.get(cell) for *_, cell in adaptive],
+                on_round=progress(adaptive)
+            )
+        for (request_idx, _, todo, key, _, _), scenario_accumulated in zip(fixed + adaptive, accumulated):
+            computed = {observable: summarize(scenario_accumulated[observable], observable) for observable in todo}
+            if cache is not None:
+                cache.put(key, computed)
+            summaries[request_idx].update(computed)
+        if checkpoint is not None:
+            for *_, cell in missing:
+                checkpoint.discard(cell)
+
+    return [{observable: summary[observable] for observable in dict.fromkeys(observables)}
+            for summary, (_, observables) in zip(summaries, requests)]
@@ -0,0 +1,50 @@
+from typing import NamedTuple
+from statistics import NormalDist
+
+import numpy as np
+
+
+def wilson_interval(count, n_runs, confidence: float = 0.95):
+    """Wilson score interval of a binomial proportion
+
+    Args:
+        count (int or np.ndarray): Number of successes
+        n_runs (int or np.ndarray): Number of trials
+        confidence (float): Coverage of the interval
+
+    Returns:
+        tuple: (lower, upper) bounds
+    """
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    n_runs = np.asarray(n_runs, dtype=float)
+    p = np.asarray(count, dtype=float) / n_runs
+    denominator = 1 + z**2 / n_runs
+    center = (p + z**2 / (2 * n_runs)) / denominator
+    half_width = z * np.sqrt(p * (1 - p) / n_runs + z**2 / (4 * n_runs**2)) / denominator
+    return center - half_width, center + half_width
+
+
+class AdaptiveSampling(NamedTuple):
+    """Sequential sampling rule for percolation probabilities
+
+    Runs are drawn in batches until the Wilson interval of every requested
+    percolation probability is at most `ci_width` wide, or the scenario's
+    n_runs (the run cap) is reached.
+
+    Attributes:
+        ci_width (float): Target width of the confidence interval
+        confidence (float): Coverage of the confidence interval
+        batch_size (int): Runs added per round, a multiple of the runner's chunk size
+        min_runs (int): Runs drawn before the interval is first checked
+    """
+    ci_width: float = 0.05
+    confidence: float = 0.95
+    batch_size: int = 50
+    min_runs: int = 50
+
+    def converged(self, counts, n_runs: int):
+        """Whether the intervals of all `counts` out of `n_runs` are narrow enough"""
+        if n_runs < self.min_runs:
+            return False
+        lower, upper = wilson_interval(np.asarray(counts), n_runs, self.confidence)
+        return bool(np.all(upper - lower <= self.ci_width))
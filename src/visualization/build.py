@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import hashlib
+import traceback
+from typing import Callable, NamedTuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+DEFAULT_STATE = os.path.join("figures", ".build.json")
+
+
+class Task(NamedTuple):
+    """A build step
+
+    `function` is called with the return values of `deps`, in order, and must
+    be picklable (a module-level function or a functools.partial of one) when
+    tasks run in worker processes. A task with `outputs` is up to date when
+    they are all newer than its `sources` and its `signature` (the repr of its
+    declared inputs) is the one recorded by its last successful build.
+    """
+    name: str
+    function: Callable
+    deps: tuple = ()
+    outputs: tuple = ()
+    sources: tuple = ()
+    signature: str = ''
+
+
+class TaskReport(NamedTuple):
+    name: str
+    status: str  # "built", "failed", "skipped" (a dependency failed) or "up to date"
+    seconds: float = 0.0
+    value: object = None
+    error: str = None
+
+
+def digest(value):
+    """Short stable hash of the repr of `value`, used as a task signature"""
+    return hashlib.sha256(repr(value).encode()).hexdigest()[:16]
+
+
+class BuildState:
+    def __init__(self, path: str = DEFAULT_STATE):
+        """Signatures of the last successful build of each task, stored as JSON
+
+        Parameters:
+
+            path (str): State file, created on the first `save`
+        """
+        self.path = path
+        try:
+            with open(path) as f:
+                self.signatures = json.load(f)
+        except (OSError, ValueError):
+            self.signatures = {}
+
+    def up_to_date(self, task: Task):
+        """Whether the outputs of `task` exist, are newer than its sources and match its signature"""
+        if not task.outputs or self.signatures.get(task.name) != task.signature:
+            return False
+        try:
+            built = min(os.path.getmtime(path) for path in task.outputs)
+        except OSError:
+            return False
+        return all(os.path.getmtime(path) <= built for path in task.sources)
+
+    def record(self, task: Task):
+        self.signatures[task.name] = task.signature
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.signatures, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    value = function(*args)
+    return value, time.perf_counter() - start
+
+
+def run_tasks(tasks, jobs: int = 1):
+    """Run tasks in dependency order, independent ones concurrently
+
+    A failing task does not stop the build: its dependents are skipped and
+    every other task still runs.
+
+    Args:
+        tasks (list): Task instances; dependencies must be in the list
+        jobs (int): Tasks run at once, each in its own worker process; with 1
+            they run one after another in this process
+
+    Returns:
+        dict: {task name: TaskReport}, in completion order
+    """
+    tasks = {task.name: task for task in tasks}
+    for task in tasks.values():
+        missing = set(task.deps) - set(tasks)
+        if missing:
+            raise ValueError(f"Task {task.name} depends on unknown tasks {sorted(missing)}")
+    reports = {}
+    pending = dict(tasks)
+
+    def ready():
+        """Pop the pending tasks whose dependencies are all built, skipping those with a failed one"""
+        runnable = []
+        for name, task in list(pending.items()):
+            deps = [reports.get(dep) for dep in task.deps]
+            if any(report is not None and report.status != "built" for report in deps):
+                reports[name] = TaskReport(name, "skipped")
+            elif all(report is not None for report in deps):
+                runnable.append((task, [report.value for report in deps]))
+            else:
+                continue
+            del pending[name]
+        return runnable
+
+    def finish(name, result):
+        try:
+            value, seconds = result()
+            reports[name] = TaskReport(name, "built", seconds, value)
+        except Exception:
+            reports[name] = TaskReport(name, "failed", error=traceback.format_exc())
+            print(f"Task {name} failed:\n{reports[name].error}")
+
+    def stalled():
+        return ValueError(f"Dependency cycle between tasks {sorted(pending)}")
+
+    if jobs <= 1:
+        while pending:
+            n_pending = len(pending)
+            for task, args in ready():
+                finish(task.name, lambda: _timed(task.function, *args))
+            if len(pending) == n_pending:
+                raise stalled()
+        return reports
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        running = {}
+        while pending or running:
+            n_pending = len(pending)
+            for task, args in ready():
+                running[executor.submit(_timed, task.function, *args)] = task.name
+            if not running:
+                if len(pending) == n_pending:
+                    raise stalled()
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future), future.result)
+    return reports
+
+
+def print_summary(reports: dict):
+    """Per-task status and wall time, longest first"""
+    print(f"{'task':30s} {'status':12s} {'seconds':>10s}")
+    for report in sorted(reports.values(), key=lambda report: -report.seconds):
+        print(f"{report.name:30s} {report.status:12s} {report.seconds:10.2f}")
@@ -4,21 +4,113 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
-from collections import defaultdict
-from scipy.interpolate import interp1d
-import random
 from models.SIR import SIRSimulation
+from models.runner import scenario_grid
+from models.observables import percolation
+from models.planner import run_requests
+from models.cache import ResultCache
+from models.sampling import AdaptiveSampling
+from models.critical import find_critical_densities
 
-os.makedirs("figures", exist_ok=True)
+MODEL_TYPES = ['strong_infectiousness', 'hub']
+LAMBDA_SIM = [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]
+N_VALUES = np.arange(150, 901, 50)
+N_RUNS = 1000  # Run cap per cell, cells are sampled until CI_WIDTH is reached
+CI_WIDTH = 0.05  # Width of the 95% confidence interval of each probability
+# Percolation threshold as per paper
+THRESHOLDS = {'strong_infectiousness': 5.5, 'hub': 5}
+SEARCH_RUNS = 100  # Runs per N visited by the critical density search
 
-def plot_critical_density():
-    """Plot the Critical density"""
+def critical_density_requests():
+    """Simulations needed by the critical density figure
+    
+    Returns:
+        list: (sim, scenario, observables) requests, one per (model, λ, N)
+    """
+    sim = SIRSimulation()
+    return [(sim, scenario, [percolation(THRESHOLDS[scenario.model_type])])
+            for model_type in MODEL_TYPES
+            for scenario in scenario_grid(N_VALUES, LAMBDA_SIM, [model_type], N_RUNS)]
+
+def grid_critical_densities(results):
+    """Critical densities from the percolation probabilities on the N_VALUES grid
+    
+    The critical density of each (model, λ) is where the linear interpolation
+    of the percolation probability is closest to 0.5.
+    
+    Args:
+        results (list): Summaries of `critical_density_requests`, in order
+    
+    Returns:
+        dict: {model_type: ρ_c π r0² per λ in LAMBDA_SIM}
+    """
+    from scipy.interpolate import interp1d
+    sim = SIRSimulation()
+    r0 = sim.r0
+    N_values = N_VALUES
+    results = iter(results)
+    critical = {}
+
+    for model_type in MODEL_TYPES:
+        sim_points = critical[model_type] = []
+        for lambda_val in LAMBDA_SIM:
+            M = THRESHOLDS[model_type]
+            percolation_probs = []
+            rho_values = []
+            for N in N_values:
+                summary = next(results)[percolation(M)]
+                percolation_prob = summary['count'] / summary['n_runs']
+                percolation_probs.append(percolation_prob)
+                rho_values.append(N / sim.L ** 2)
+
+            # Interpolate to find critical density where percolation_prob ~ 0.5
+            interp = interp1d(rho_values, percolation_probs, bounds_error=False, fill_value=(0, 1))
+            rho_range = np.linspace(min(rho_values), max(rho_values), 1000)
+            probs = interp(rho_range)
+            critical_rho = rho_range[np.argmin(np.abs(probs - 0.5))]
+            sim_points.append(critical_rho * np.pi * r0 ** 2)
+    return critical
+
+def search_critical_densities(seed=0, n_workers=None, cache=None, engine='ensemble', instrumentation=None):
+    """Critical densities located directly by a sequential logistic-fit search
+    
+    See `models.critical.find_critical_densities`; a few hundred runs per
+    (model, λ), concentrated around the 0.5 crossing, replace the full grid.
+    
+    Returns:
+        tuple: ({model_type: ρ_c π r0² per λ}, {model_type: (2, n_λ) distances
+            from the estimate to its 95% confidence bounds})
+    """
+    sim = SIRSimulation()
+    scale = np.pi * sim.r0 ** 2 / sim.L ** 2
+    targets = [(lambda_val, model_type, THRESHOLDS[model_type])
+               for model_type in MODEL_TYPES for lambda_val in LAMBDA_SIM]
+    estimates = iter(find_critical_densities(sim, targets, (N_VALUES[0], N_VALUES[-1]), SEARCH_RUNS, seed=seed,
+                                             n_workers=n_workers, cache=cache, desc='Searching critical densities',
+                                             engine=engine, instrumentation=instrumentation))
+    critical = {}
+    errors = {}
+    for model_type in MODEL_TYPES:
+        found = [next(estimates) for _ in LAMBDA_SIM]
+        critical[model_type] = [estimate.N * scale for estimate in found]
+        errors[model_type] = np.array([[(estimate.N - estimate.lower) * scale for estimate in found],
+                                       [(estimate.upper - estimate.N) * scale for estimate in found]])
+    return critical, errors
+
+def render_critical_density(results, errors=None):
+    """Plot the Critical density
+    
+    Args:
+        results (list or dict): Summaries of `critical_density_requests`, in order,
+            or {model_type: ρ_c π r0² per λ} from `search_critical_densities`
+        errors (dict): Optional {model_type: (2, n_λ) error bar lengths}
+    """
+    import matplotlib.pyplot as plt
+    os.makedirs("figures", exist_ok=True)
     sim = SIRSimulation()
     lambda_values = np.linspace(0, 1, 10)
-    N_values = np.arange(150, 901, 50)
-    n_runs = 1000
+    critical = results if isinstance(results, dict) else grid_critical_densities(results)
+    errors = errors or {}
     
     
     # Analytical curves
@@ -39,42 +131,18 @@ def plot_critical_density():
     hub_critical = R_c_hub * w0 * np.pi * (r0**2) / (lambda_values * I_ss_hub + (1 - lambda_values) * I_n_hub)
     
     # Simulation points
-    lambda_sim = [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]
-    strong_sim = []
-    hub_sim = []
-
-    for model_type, sim_points in [('strong_infectiousness', strong_sim), ('hub', hub_sim)]:
-        for lambda_val in tqdm(lambda_sim, desc=f'Critical density {model_type}'):
-            if model_type == "strong_infectiousness":
-                M = 5.5
-            else: 
-                M = 5
-            percolation_probs = []
-            rho_values = []
-            for N in tqdm(N_values):
-                percolated_count = 0
-                for _ in range(n_runs):
-                    result = sim.run_simulation(N, lambda_val, model_type)
-                    max_dist = max(result['max_distances']) if result['max_distances'] else 0
-                    if max_dist >= M:  # Percolation threshold as per paper
-                        percolated_count += 1
-                percolation_prob = percolated_count / n_runs
-                percolation_probs.append(percolation_prob)
-                rho_values.append(N / (10 * r0) ** 2)
-
-            # Interpolate to find critical density where percolation_prob ~ 0.5
-            interp = interp1d(rho_values, percolation_probs, bounds_error=False, fill_value=(0, 1))
-            rho_range = np.linspace(min(rho_values), max(rho_values), 1000)
-            probs = interp(rho_range)
-            critical_rho = rho_range[np.argmin(np.abs(probs - 0.5))]
-            sim_points.append(critical_rho * np.pi * r0 ** 2)
+    lambda_sim = LAMBDA_SIM
+    strong_sim = critical['strong_infectiousness']
+    hub_sim = critical['hub']
 
     # Plotting
     plt.figure(figsize=(8, 6))
     plt.plot(lambda_values, strong_critical, 'g-', linewidth=2, label='Strong Model')
     plt.plot(lambda_values, hub_critical, 'm--', linewidth=2, label='Hub Model')
-    plt.plot(lambda_sim, strong_sim, 'go', markersize=8, label='Strong Simulation')
-    plt.plot(lambda_sim, hub_sim, 'ms', markersize=8, label='Hub Simulation')
+    plt.errorbar(lambda_sim, strong_sim, yerr=errors.get('strong_infectiousness'), fmt='go', markersize=8,
+                 capsize=3, label='Strong Simulation')
+    plt.errorbar(lambda_sim, hub_sim, yerr=errors.get('hub'), fmt='ms', markersize=8,
+                 capsize=3, label='Hub Simulation')
     plt.xlabel(r'$\lambda$')
     plt.ylabel(r'$\rho_c \pi r_0^2$')
     plt.title('Dependence of Critical Density on Superspreader Fraction')
@@ -85,6 +153,49 @@ def plot_critical_density():
     plt.tight_layout()
     plt.savefig('figures/critical_density.png', dpi=300)
     plt.close()
+
+def critical_density_frame(critical, errors):
+    """Tidy table of `search_critical_densities` output, one row per (model, λ)"""
+    import pandas as pd
+
+    return pd.DataFrame([{'model_type': model_type, 'lambda_val': lambda_val,
+                          'critical': critical[model_type][i],
+                          'error_lower': errors[model_type][0][i], 'error_upper': errors[model_type][1][i]}
+                         for model_type in MODEL_TYPES for i, lambda_val in enumerate(LAMBDA_SIM)])
+
+def critical_density_from_frame(frame):
+    """Output of `search_critical_densities` read back from `critical_density_frame`"""
+    critical = {}
+    errors = {}
+    for model_type in MODEL_TYPES:
+        rows = frame[frame['model_type'] == model_type].set_index('lambda_val').loc[LAMBDA_SIM]
+        critical[model_type] = rows['critical'].tolist()
+        errors[model_type] = rows[['error_lower', 'error_upper']].to_numpy().T
+    return critical, errors
+
+def plot_critical_density(seed=0, n_workers=None, cache=True, ci_width=CI_WIDTH, method='search', engine='ensemble'):
+    """Simulate and plot the Critical density
+    
+    Args:
+        seed (int): Root seed of the Monte Carlo runs
+        n_workers (int): Number of worker processes, all cores if None
+        cache (bool): Reuse results from the on-disk result cache
+        ci_width (float): Target confidence interval width of the adaptive sampling
+            of the grid, None to always use N_RUNS runs
+        method (str): 'search' to locate each critical density directly, with
+            confidence bounds, or 'grid' to interpolate the N_VALUES grid
+        engine (str): "ensemble" for independent runs per scenario, "graph" to share
+            populations and random numbers across superspreader fractions and models
+    """
+    if method == 'search':
+        critical, errors = search_critical_densities(seed, n_workers, ResultCache() if cache else None, engine)
+        render_critical_density(critical, errors)
+    elif method == 'grid':
+        results = run_requests(critical_density_requests(), seed, n_workers, ResultCache() if cache else None,
+                               AdaptiveSampling(ci_width) if ci_width else None, engine)
+        render_critical_density(results)
+    else:
+        raise ValueError(f"Unknown method: {method}")
     
 if __name__ == "__main__":
     plot_critical_density()
\ No newline at end of file
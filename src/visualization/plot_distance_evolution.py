@@ -3,47 +3,58 @@ import sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
-from collections import defaultdict
-from scipy.interpolate import interp1d
-import random
 from models.SIR import SIRSimulation
+from models.runner import Scenario
+from models.observables import FRONT_CURVE, front_quantiles
+from models.planner import run_requests
+from models.cache import ResultCache
 
-os.makedirs("figures", exist_ok=True)
+LAMBDA_VALUES = [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]
+N = 500
+N_RUNS = 1000
+MAX_STEPS = 100
 
-def plot_distance_evolution():
-    """Plot the distance evolution"""
+def front_band(sim):
+    """Front quantile observable binned up to the farthest distance from the origin in the periodic square"""
+    return front_quantiles(sim.L / 2**0.5)
+
+def distance_evolution_requests():
+    """Simulations needed by the distance evolution figure
+    
+    Returns:
+        list: (sim, scenario, observables) requests, one per λ
+    """
     sim = SIRSimulation()
-    lambda_values = [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]
-    N = 500
-    n_runs = 1000
-    max_steps = 100
+    observables = [FRONT_CURVE, front_band(sim)]
+    return [(sim, Scenario(N, lambda_val, 'strong_infectiousness', N_RUNS, MAX_STEPS), observables)
+            for lambda_val in LAMBDA_VALUES]
+
+def render_distance_evolution(results):
+    """Plot the distance evolution, the mean over runs with its interquartile band
+    
+    Args:
+        results (list): Summaries of `distance_evolution_requests`, in order
+    """
+    import matplotlib.pyplot as plt
+    os.makedirs("figures", exist_ok=True)
+    lambda_values = LAMBDA_VALUES
+    max_steps = MAX_STEPS
     
     colors = ['red', 'green', 'purple', 'blue', 'yellow', 'pink']
     markers = ['o', 's', 's', 's', '^', '^']
     
     plt.figure(figsize=(10, 8))
     
-    for lambda_idx, lambda_val in enumerate(lambda_values):
-        all_distances = []
-        
-        for _ in tqdm(range(n_runs), desc=f'λ={lambda_val}'):
-            result = sim.run_simulation(N, lambda_val, 'strong_infectiousness', max_steps)
-            distances = result['max_distances']
-            # Pad with last value if simulation ended early
-            while len(distances) < max_steps:
-                distances.append(distances[-1] if distances else 0)
-            all_distances.append(distances)
-        
-        # Calculate average
-        avg_distances = np.mean(all_distances, axis=0)
+    for lambda_idx, (lambda_val, result) in enumerate(zip(lambda_values, results)):
+        # Average over runs
+        avg_distances = result[FRONT_CURVE]['mean']
+        quantiles = result[front_band(SIRSimulation())]
         time_steps = range(max_steps)
         
         plt.plot(time_steps, avg_distances, 
                 color=colors[lambda_idx], marker=markers[lambda_idx], 
                 markersize=4, label=f'λ = {lambda_val}')
+        plt.fill_between(time_steps, quantiles['q25'], quantiles['q75'], color=colors[lambda_idx], alpha=0.15)
     
     plt.xlabel('Time')
     plt.ylabel(r'$r_{t}/r_{0}$')
@@ -56,5 +67,16 @@ def plot_distance_evolution():
     plt.savefig('figures/strong_distance_evolution.png', dpi=300)
     plt.close()
 
+def plot_distance_evolution(seed=0, n_workers=None, cache=True):
+    """Simulate and plot the distance evolution
+    
+    Args:
+        seed (int): Root seed of the Monte Carlo runs
+        n_workers (int): Number of worker processes, all cores if None
+        cache (bool): Reuse results from the on-disk result cache
+    """
+    results = run_requests(distance_evolution_requests(), seed, n_workers, ResultCache() if cache else None)
+    render_distance_evolution(results)
+
 if __name__ == "__main__":
     plot_distance_evolution()
\ No newline at end of file
@@ -3,68 +3,78 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
 from models.SIR import SIRSimulation
+from models.runner import Scenario
+from models.observables import EPIDEMIC_CURVE, EPIDEMIC_STATISTICS
+from models.analytics import curve_statistics, replica_summary
+from models.planner import run_requests
+from models.cache import ResultCache
 
-def analyze_epidemic_curves(strong_data, hub_data, no_super_data):
+N = 500
+N_RUNS = 1000
+MAX_STEPS = 100
+# Per-run curve statistic -> how it is summarized over runs; the asymmetry is a
+# heavy-tailed ratio, so its median is used
+SPREAD_STATISTICS = {
+    'peak_day': np.mean,
+    'peak_height': np.mean,
+    'width': np.mean,
+    'asymmetry': np.median,
+    'final_size': np.mean,
+}
+
+def analyze_epidemic_curves(strong_data, hub_data, no_super_data, replicas=None, seed=0):
     """
     Analyze epidemic curve characteristics.
     
+    The statistics of the three averaged curves are computed together by
+    `models.analytics.curve_statistics`. Given the statistics of every run,
+    their spread over runs is added with bootstrap confidence intervals.
+    
     Args:
         strong_data: New infections per time step for strong model
         hub_data: New infections per time step for hub model  
         no_super_data: New infections per time step for no superspreaders
+        replicas (dict): Optional {'strong'/'hub'/'no_super': per-run statistics},
+            the EPIDEMIC_STATISTICS summaries of the three scenarios
+        seed (int): Seed of the bootstrap resampling
         
     Returns:
-        dict: Analysis results including peak timing, magnitude, and curve shapes
+        dict: Analysis results including peak timing, magnitude, and curve shapes,
+            plus 'replica_spread' {model: {statistic: {'value', 'ci', 'n_dropped'}}}
+            if `replicas` is given, see SPREAD_STATISTICS and
+            `models.analytics.replica_summary`; runs peaking at once have an
+            infinite asymmetry and are dropped from its summary
     """
-    analysis = {
-        'peak_analysis': {},
-        'total_infections': {},
-        'curve_characteristics': {},
-        'superspreader_impact': {}
-    }
+    names = ['strong', 'hub', 'no_super']
+    statistics = curve_statistics(np.stack([strong_data, hub_data, no_super_data]))
+    peak_day = statistics['peak_day']
+    peak_magnitude = statistics['peak_height']
+    fall_time = len(strong_data) - peak_day - 1
+    with np.errstate(divide='ignore'):
+        rise_rate = np.where(peak_day > 0, peak_magnitude / np.maximum(peak_day, 1), np.inf)
+        fall_rate = np.where(fall_time > 0, peak_magnitude / np.maximum(fall_time, 1), np.inf)
+        peak_ratio = peak_magnitude / peak_magnitude[2] if peak_magnitude[2] > 0 else np.full(3, np.inf)
     
-    curves = {
-        'strong': strong_data,
-        'hub': hub_data,
-        'no_super': no_super_data
+    analysis = {
+        'peak_analysis': {
+            name: {
+                'peak_day': peak_day[i],
+                'peak_magnitude': peak_magnitude[i],
+                'peak_ratio_vs_no_super': peak_ratio[i]
+            } for i, name in enumerate(names)
+        },
+        'total_infections': {name: statistics['final_size'][i] for i, name in enumerate(names)},
+        'curve_characteristics': {
+            name: {
+                'curve_width': statistics['width'][i],
+                'asymmetry': statistics['asymmetry'][i],
+                'rise_rate': rise_rate[i],
+                'fall_rate': fall_rate[i]
+            } for i, name in enumerate(names)
+        },
     }
     
-    for model_name, curve in curves.items():
-        # Find peak
-        peak_day = np.argmax(curve)
-        peak_magnitude = max(curve)
-        
-        # Total infections (area under curve)
-        total_infections = np.sum(curve)
-        
-        # Curve width (days with >10% of peak)
-        threshold = 0.1 * peak_magnitude
-        above_threshold = np.where(curve > threshold)[0]
-        curve_width = len(above_threshold) if len(above_threshold) > 0 else 0
-        
-        # Asymmetry (ratio of rise time to fall time)
-        rise_time = peak_day
-        fall_time = len(curve) - peak_day - 1
-        asymmetry = fall_time / rise_time if rise_time > 0 else float('inf')
-        
-        analysis['peak_analysis'][model_name] = {
-            'peak_day': peak_day,
-            'peak_magnitude': peak_magnitude,
-            'peak_ratio_vs_no_super': peak_magnitude / max(no_super_data) if max(no_super_data) > 0 else float('inf')
-        }
-        
-        analysis['total_infections'][model_name] = total_infections
-        
-        analysis['curve_characteristics'][model_name] = {
-            'curve_width': curve_width,
-            'asymmetry': asymmetry,
-            'rise_rate': peak_magnitude / peak_day if peak_day > 0 else float('inf'),
-            'fall_rate': peak_magnitude / fall_time if fall_time > 0 else float('inf')
-        }
-    
     # Superspreader impact analysis
     analysis['superspreader_impact'] = {
         'peak_enhancement_strong': analysis['peak_analysis']['strong']['peak_ratio_vs_no_super'],
@@ -74,56 +84,57 @@ def analyze_epidemic_curves(strong_data, hub_data, no_super_data):
         'model_comparison': analysis['peak_analysis']['hub']['peak_magnitude'] / analysis['peak_analysis']['strong']['peak_magnitude']
     }
     
+    if replicas is not None:
+        analysis['replica_spread'] = {
+            name: {
+                statistic: replica_summary(replicas[name][statistic], reduce, rng=seed)
+                for statistic, reduce in SPREAD_STATISTICS.items()
+            } for name in names
+        }
+    
     return analysis
 
-def plot_epidemic_curves():
+def epidemic_curves_requests():
+    """
+    Simulations needed by the epidemic curves figure.
+    
+    Returns:
+        list: (sim, scenario, observables) requests for Strong (λ=0.2), Hub (λ=0.2)
+            and no superspreaders (λ=0.0)
+    """
+    sim = SIRSimulation()
+    scenarios = [
+        Scenario(N, 0.2, 'strong_infectiousness', N_RUNS, MAX_STEPS),
+        Scenario(N, 0.2, 'hub', N_RUNS, MAX_STEPS),
+        Scenario(N, 0.0, 'strong_infectiousness', N_RUNS, MAX_STEPS),
+    ]
+    return [(sim, scenario, [EPIDEMIC_CURVE, EPIDEMIC_STATISTICS]) for scenario in scenarios]
+
+def render_epidemic_curves(results):
     """
     Plot epidemic curves comparing different superspreader models.
     
     This function generates epidemic curves showing new infections over time
     for Strong model, Hub model, and no superspreaders scenario.
+    
+    Args:
+        results (list): Summaries of `epidemic_curves_requests`, in order
+        
+    Returns:
+        dict: Analysis of the averaged curves and of their spread over runs,
+            see `analyze_epidemic_curves`
     """
-    sim = SIRSimulation()
-    N = 500
-    n_runs = 1000
-    max_steps = 100
+    import matplotlib.pyplot as plt
+    max_steps = MAX_STEPS
     
     os.makedirs("figures", exist_ok=True)
     
-    # Run simulations
-    strong_02_infections = []
-    hub_02_infections = []
-    no_super_infections = []
-    
-    for _ in tqdm(range(n_runs), desc='Generating epidemic curves'):
-        # Strong model, λ=0.2
-        result = sim.run_simulation(N, 0.2, 'strong_infectiousness', max_steps)
-        infections = result['new_infections_per_step']
-        while len(infections) < max_steps:
-            infections.append(0)
-        strong_02_infections.append(infections)
-        
-        # Hub model, λ=0.2
-        result = sim.run_simulation(N, 0.2, 'hub', max_steps)
-        infections = result['new_infections_per_step']
-        while len(infections) < max_steps:
-            infections.append(0)
-        hub_02_infections.append(infections)
-        
-        # No superspreaders, λ=0.0
-        result = sim.run_simulation(N, 0.0, 'strong_infectiousness', max_steps)
-        infections = result['new_infections_per_step']
-        while len(infections) < max_steps:
-            infections.append(0)
-        no_super_infections.append(infections)
-    
-    # Calculate averages and confidence intervals
-    avg_strong_02 = np.mean(strong_02_infections, axis=0)
-    std_strong_02 = np.std(strong_02_infections, axis=0)
-    avg_hub_02 = np.mean(hub_02_infections, axis=0)
-    std_hub_02 = np.std(hub_02_infections, axis=0)
-    avg_no_super = np.mean(no_super_infections, axis=0)
-    std_no_super = np.std(no_super_infections, axis=0)
+    strong_02, hub_02, no_super = [result[EPIDEMIC_CURVE] for result in results]
+    
+    # Averages and confidence intervals
+    avg_strong_02, std_strong_02 = strong_02['mean'], strong_02['std']
+    avg_hub_02, std_hub_02 = hub_02['mean'], hub_02['std']
+    avg_no_super, std_no_super = no_super['mean'], no_super['std']
     
     time_steps = range(max_steps)
     
@@ -146,7 +157,8 @@ def plot_epidemic_curves():
     plt.ylim(0, max(max(avg_strong_02), max(avg_hub_02), max(avg_no_super)) * 1.2)
     
     # Perform analysis
-    analysis = analyze_epidemic_curves(avg_strong_02, avg_hub_02, avg_no_super)
+    replicas = {name: result[EPIDEMIC_STATISTICS] for name, result in zip(['strong', 'hub', 'no_super'], results)}
+    analysis = analyze_epidemic_curves(avg_strong_02, avg_hub_02, avg_no_super, replicas)
     
     # Add peak markers
     for model_name, color in [('strong', 'red'), ('hub', 'blue'), ('no_super', 'cyan')]:
@@ -164,5 +176,20 @@ def plot_epidemic_curves():
     
     return analysis
 
+def plot_epidemic_curves(seed=0, n_workers=None, cache=True):
+    """
+    Simulate and plot epidemic curves comparing different superspreader models.
+    
+    Args:
+        seed (int): Root seed of the Monte Carlo runs
+        n_workers (int): Number of worker processes, all cores if None
+        cache (bool): Reuse results from the on-disk result cache
+        
+    Returns:
+        dict: Analysis of the averaged curves, see `analyze_epidemic_curves`
+    """
+    results = run_requests(epidemic_curves_requests(), seed, n_workers, ResultCache() if cache else None)
+    return render_epidemic_curves(results)
+
 if __name__ == "__main__":
     plot_epidemic_curves() 
\ No newline at end of file
@@ -3,7 +3,6 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import numpy as np
-import matplotlib.pyplot as plt
 from models.SIR import SIRSimulation
 
 def plot_infection_probabilities():
@@ -13,13 +12,14 @@ def plot_infection_probabilities():
     This function generates two plots showing how infection probability varies with distance
     for both normal individuals and superspreaders in each model.
     """
+    import matplotlib.pyplot as plt
     sim = SIRSimulation()
     os.makedirs("figures", exist_ok=True)
 
     # Figure 1: Strong Infectiousness Model
     r_values = np.linspace(0, 1, 100)
-    prob_normal = [sim.infection_probability(r, False, model_type="strong_infectiousness") for r in r_values]
-    prob_super = [sim.infection_probability(r, True, model_type="strong_infectiousness") for r in r_values]
+    prob_normal = sim.infection_probabilities(r_values, False, model_type="strong_infectiousness")
+    prob_super = sim.infection_probabilities(r_values, True, model_type="strong_infectiousness")
     
     plt.figure(figsize=(10, 6))
     plt.plot(r_values, prob_super, 'orange', linewidth=3, label='Superspreader')
@@ -37,8 +37,8 @@ def plot_infection_probabilities():
     
     # Figure 2: Hub Model
     r_values_hub = np.linspace(0, 2.5, 250)
-    prob_normal_hub = [sim.infection_probability(r, False, model_type="hub") for r in r_values_hub]
-    prob_super_hub = [sim.infection_probability(r, True, model_type="hub") for r in r_values_hub]
+    prob_normal_hub = sim.infection_probabilities(r_values_hub, False, model_type="hub")
+    prob_super_hub = sim.infection_probabilities(r_values_hub, True, model_type="hub")
     
     plt.figure(figsize=(10, 6))
     plt.plot(r_values_hub, prob_super_hub, 'orange', linewidth=3, label='Superspreader')
@@ -3,22 +3,48 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
 from models.SIR import SIRSimulation
+from models.runner import scenario_grid
+from models.observables import percolation
+from models.planner import run_requests
+from models.cache import ResultCache
+from models.checkpoint import SweepCheckpoint
+from models.sampling import AdaptiveSampling
 
-def plot_percolation_probability():
+MODEL_TYPES = ['strong_infectiousness', 'hub']
+LAMBDA_VALUES = [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]
+N_VALUES = range(150, 901, 10)
+N_RUNS = 1000  # Run cap per cell, cells are sampled until CI_WIDTH is reached
+CI_WIDTH = 0.05  # Width of the 95% confidence interval of each probability
+THRESHOLD = 5  # Percolation threshold
+
+def percolation_probability_requests():
+    """
+    Simulations needed by the percolation probability figures.
+    
+    Returns:
+        list: (sim, scenario, observables) requests, one per (model, λ, N)
+    """
+    sim = SIRSimulation()
+    return [(sim, scenario, [percolation(THRESHOLD)])
+            for scenario in scenario_grid(N_VALUES, LAMBDA_VALUES, MODEL_TYPES, N_RUNS)]
+
+def render_percolation_probability(results):
     """
     Plot the percolation probabilities for Strong Infectiousness and Hub models.
     
     This function generates plots showing how percolation probability varies with density
     for different superspreader fractions in both models.
+    
+    Args:
+        results (list): Summaries of `percolation_probability_requests`, in order
     """
+    import matplotlib.pyplot as plt
     sim = SIRSimulation()
     L = sim.L
-    lambda_values = [0.0, 0.2, 0.4, 0.6, 0.8, 1.0]
-    N_values = range(150, 901, 10)
-    n_runs = 1000
+    lambda_values = LAMBDA_VALUES
+    N_values = N_VALUES
+    results = iter(results)
     
     os.makedirs("figures", exist_ok=True)
     
@@ -31,7 +57,7 @@ def plot_percolation_probability():
         'hub': {'densities': [], 'probabilities': []}
     }
     
-    for model_idx, model_type in enumerate(['strong_infectiousness', 'hub']):
+    for model_idx, model_type in enumerate(MODEL_TYPES):
         plt.figure(figsize=(10, 8))
         
         model_percolation_data = []
@@ -40,16 +66,10 @@ def plot_percolation_probability():
             percolation_probs = []
             rho_pi_r0_squared = []
             
-            for N in tqdm(N_values, desc=f'{model_type} model, λ={lambda_val}'):
-                percolated_count = 0
-                
-                for _ in range(n_runs):
-                    result = sim.run_simulation(N, lambda_val, model_type)
-                    max_dist = max(result['max_distances']) if result['max_distances'] else 0
-                    if max_dist >= 5:  # Percolation threshold
-                        percolated_count += 1
+            for N in N_values:
+                summary = next(results)[percolation(THRESHOLD)]
                 
-                percolation_prob = percolated_count / n_runs
+                percolation_prob = summary['count'] / summary['n_runs']
                 percolation_probs.append(percolation_prob)
                 rho_pi_r0_squared.append(N * np.pi / L ** 2)
             
@@ -71,6 +91,27 @@ def plot_percolation_probability():
         plt.tight_layout()
         plt.savefig(f'figures/{model_type}_percolation.png', dpi=300, bbox_inches='tight')
         plt.close()
+
+def plot_percolation_probability(seed=0, n_workers=None, cache=True, ci_width=CI_WIDTH, engine='ensemble',
+                                 checkpoint=True):
+    """
+    Simulate and plot the percolation probabilities for Strong Infectiousness and Hub models.
+    
+    Args:
+        seed (int): Root seed of the Monte Carlo runs
+        n_workers (int): Number of worker processes, all cores if None
+        cache (bool): Reuse results from the on-disk result cache
+        ci_width (float): Target confidence interval width of the adaptive sampling,
+            None to always use N_RUNS runs
+        engine (str): "ensemble" for independent runs per scenario, "graph" to share
+            populations and random numbers across superspreader fractions and models
+        checkpoint (bool): Periodically save the partial results of the sweep, and
+            resume from those of an interrupted one
+    """
+    results = run_requests(percolation_probability_requests(), seed, n_workers, ResultCache() if cache else None,
+                           AdaptiveSampling(ci_width) if ci_width else None, engine,
+                           checkpoint=SweepCheckpoint() if checkpoint else None)
+    render_percolation_probability(results)
         
 
 if __name__ == "__main__":
@@ -3,51 +3,57 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
 from models.SIR import SIRSimulation
+from models.runner import scenario_grid
+from models.observables import FRONT_VELOCITY
+from models.planner import run_requests
+from models.cache import ResultCache
 
-def plot_propagation_velocity():
+MODEL_TYPES = ['strong_infectiousness', 'hub']
+LAMBDA_VALUES = np.linspace(0, 1, 20)
+N = 500
+N_RUNS = 1000
+MAX_STEPS = 100
+
+def propagation_velocity_requests():
+    """
+    Simulations needed by the propagation velocity figure.
+    
+    Returns:
+        list: (sim, scenario, observables) requests, one per (model, λ)
+    """
+    sim = SIRSimulation()
+    return [(sim, scenario, [FRONT_VELOCITY])
+            for scenario in scenario_grid([N], LAMBDA_VALUES, MODEL_TYPES, N_RUNS, MAX_STEPS)]
+
+def render_propagation_velocity(results):
     """
     Plot propagation velocity as a function of superspreader fraction.
     
     This function compares how epidemic propagation velocity varies with superspreader
-    fraction for both Strong Infectiousness and Hub models.
+    fraction for both Strong Infectiousness and Hub models, with the bootstrap 95%
+    confidence interval of each mean shaded.
+    
+    Args:
+        results (list): Summaries of `propagation_velocity_requests`, in order
     """
-    sim = SIRSimulation()
-    lambda_values = np.linspace(0, 1, 20)
-    N = 500
-    n_runs = 1000
-    max_steps = 100 
+    import matplotlib.pyplot as plt
+    lambda_values = LAMBDA_VALUES
     
     os.makedirs("figures", exist_ok=True)
     
     strong_velocities = []
     hub_velocities = []
+    intervals = {model_type: [] for model_type in MODEL_TYPES}
     
-    for lambda_val in tqdm(lambda_values, desc='Computing velocities'):
-        # Strong model
-        strong_vels = []
-        for _ in tqdm(range(n_runs)):
-            result = sim.run_simulation(N, lambda_val, 'strong_infectiousness', max_steps)
-            distances = result['max_distances']
-            if len(distances) > 5:
-                # Calculate velocity as slope of first 5 steps to avoid noise
-                velocity = np.polyfit(range(min(5, len(distances))), 
-                                    distances[:min(5, len(distances))], 1)[0]
-                strong_vels.append(max(0, velocity))
-        strong_velocities.append(np.mean(strong_vels) if strong_vels else 0)
-        
-        # Hub model
-        hub_vels = []
-        for _ in range(n_runs):
-            result = sim.run_simulation(N, lambda_val, 'hub', max_steps)
-            distances = result['max_distances']
-            if len(distances) > 5:
-                velocity = np.polyfit(range(min(5, len(distances))), 
-                                    distances[:min(5, len(distances))], 1)[0]
-                hub_vels.append(max(0, velocity))
-        hub_velocities.append(np.mean(hub_vels) if hub_vels else 0)
+    scenarios = scenario_grid([N], lambda_values, MODEL_TYPES, N_RUNS, MAX_STEPS)
+    for scenario, result in zip(scenarios, results):
+        velocity = float(result[FRONT_VELOCITY]['mean'])
+        intervals[scenario.model_type].append((result[FRONT_VELOCITY]['ci_lower'], result[FRONT_VELOCITY]['ci_upper']))
+        if scenario.model_type == 'strong_infectiousness':
+            strong_velocities.append(velocity)
+        else:
+            hub_velocities.append(velocity)
     
     # Create the plot
     plt.figure(figsize=(12, 8))
@@ -55,6 +61,9 @@ def plot_propagation_velocity():
              label='Strong Infectiousness Model', markeredgewidth=2, markeredgecolor='darkred')
     plt.plot(lambda_values, hub_velocities, 'bs-', markersize=8, linewidth=3, 
              label='Hub Model', markeredgewidth=2, markeredgecolor='darkblue')
+    for model_type, color in zip(MODEL_TYPES, ['red', 'blue']):
+        lower, upper = np.array(intervals[model_type], dtype=float).T
+        plt.fill_between(lambda_values, lower, upper, color=color, alpha=0.2)
     
     
     plt.xlabel(r'Superspreader Fraction ($\lambda$)', fontsize=14)
@@ -68,5 +77,20 @@ def plot_propagation_velocity():
     plt.savefig('figures/propagation_velocity.png', dpi=300, bbox_inches='tight')
     plt.close()
 
+def plot_propagation_velocity(seed=0, n_workers=None, cache=True, engine='ensemble'):
+    """
+    Simulate and plot propagation velocity as a function of superspreader fraction.
+    
+    Args:
+        seed (int): Root seed of the Monte Carlo runs
+        n_workers (int): Number of worker processes, all cores if None
+        cache (bool): Reuse results from the on-disk result cache
+        engine (str): "ensemble" for independent runs per scenario, "graph" to share
+            populations and random numbers across superspreader fractions and models
+    """
+    results = run_requests(propagation_velocity_requests(), seed, n_workers, ResultCache() if cache else None,
+                           engine=engine)
+    render_propagation_velocity(results)
+
 if __name__ == "__main__":
     plot_propagation_velocity() 
\ No newline at end of file
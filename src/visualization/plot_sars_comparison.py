@@ -4,26 +4,44 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
-from collections import defaultdict
-from scipy.interpolate import interp1d
-import random
 from models.SIR import SIRSimulation
+from models.runner import Scenario
+from models.observables import EPIDEMIC_CURVE
+from models.planner import run_requests
+from models.cache import ResultCache
 
-os.makedirs("figures", exist_ok=True)
+N = 500
+LAMBDA_VAL = 0.4
+N_RUNS = 1000
+MAX_STEPS = 25
 
-def plot_sars_comparison():
+def sars_comparison_requests():
+    """Simulations needed by the SARS comparison figures.
+
+    Returns:
+        list: (sim, scenario, observables) requests for Strong (λ=0.4), Hub (λ=0.4)
+            and no superspreaders (λ=0.0)
+    """
+    sim = SIRSimulation(r0=1, w0=1, gamma=1.0)
+    scenarios = [
+        Scenario(N, LAMBDA_VAL, 'strong_infectiousness', N_RUNS, MAX_STEPS),
+        Scenario(N, LAMBDA_VAL, 'hub', N_RUNS, MAX_STEPS),
+        Scenario(N, 0.0, 'strong_infectiousness', N_RUNS, MAX_STEPS),
+    ]
+    return [(sim, scenario, [EPIDEMIC_CURVE]) for scenario in scenarios]
+
+def render_sars_comparison(results):
     """Plot SARS secondary cases distribution and epidemic curves (Figures 14 and 15).
 
     Compares simulated secondary infections and epidemic curves for strong infectiousness
     and hub models with SARS data from Singapore (Feb–Jun 2003), based on Fujie and Odagaki (2007).
+
+    Args:
+        results (list): Summaries of `sars_comparison_requests`, in order
     """
-    sim = SIRSimulation(r0=1, w0=1, gamma=1.0)
-    N = 500
-    lambda_val = 0.4
-    n_runs = 1000
-    max_steps = 25
+    import matplotlib.pyplot as plt
+    os.makedirs("figures", exist_ok=True)
+    max_steps = MAX_STEPS
     
     sars_secondary = [0] * 150 + [1] * 25 + [2] * 15 + [3] * 10 + [4, 5, 6, 7, 8, 9, 10, 11, 12, 12, 21, 23, 40]
 
@@ -42,38 +60,13 @@ def plot_sars_comparison():
     # Approximate SARS data based on paper’s description (120 days, peak ~30–40 cases)
     sars_data = [0, 2, 10, 20, 52, 19, 18, 40, 27, 14, 12, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
 
-    # Run simulations
-    strong_infections = []
-    hub_infections = []
-    no_super_infections = []
-
-    for _ in tqdm(range(n_runs), desc='SARS comparison'):
-        # Strong model, \lambda=0.4
-        result = sim.run_simulation(N, lambda_val, 'strong_infectiousness', max_steps)
-        infections = result['new_infections_per_step']
-        while len(infections) < max_steps:
-            infections.append(0)
-        strong_infections.append(infections)
-
-        # Hub model, \lambda=0.4
-        result = sim.run_simulation(N, lambda_val, 'hub', max_steps)
-        infections = result['new_infections_per_step']
-        while len(infections) < max_steps:
-            infections.append(0)
-        hub_infections.append(infections)
-
-        # No superspreaders, \lambda=0.0
-        result = sim.run_simulation(N, 0.0, 'strong_infectiousness', max_steps)
-        infections = result['new_infections_per_step']
-        while len(infections) < max_steps:
-            infections.append(0)
-        no_super_infections.append(infections)
+    strong_infections, hub_infections, no_super_infections = [result[EPIDEMIC_CURVE]['mean'] for result in results]
 
     # Calculate averages and scale to match SARS data magnitude
     scale_factor = 0.5  # Adjust simulation output to approximate SARS case numbers
-    avg_strong = np.mean(strong_infections, axis=0) * scale_factor
-    avg_hub = np.mean(hub_infections, axis=0) * scale_factor
-    avg_no_super = np.mean(no_super_infections, axis=0) * scale_factor
+    avg_strong = strong_infections * scale_factor
+    avg_hub = hub_infections * scale_factor
+    avg_no_super = no_super_infections * scale_factor
 
     time_steps = np.arange(max_steps) * 6  # Each step = 6 days
 
@@ -92,6 +85,17 @@ def plot_sars_comparison():
     plt.tight_layout()
     plt.savefig('figures/sars_epidemic_curves.png', dpi=300)
     plt.close()
+
+def plot_sars_comparison(seed=0, n_workers=None, cache=True):
+    """Simulate and plot the SARS comparison figures (Figures 14 and 15).
+
+    Args:
+        seed (int): Root seed of the Monte Carlo runs
+        n_workers (int): Number of worker processes, all cores if None
+        cache (bool): Reuse results from the on-disk result cache
+    """
+    results = run_requests(sars_comparison_requests(), seed, n_workers, ResultCache() if cache else None)
+    render_sars_comparison(results)
     
 if __name__ == "__main__":
     plot_sars_comparison() 
\ No newline at end of file
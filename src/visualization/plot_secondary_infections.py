@@ -3,49 +3,69 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
-from scipy import stats
 from models.SIR import SIRSimulation
+from models.runner import Scenario
+from models.observables import SECONDARY_HISTOGRAM
+from models.planner import run_requests
+from models.cache import ResultCache
 
-def plot_secondary_infections():
+N = 500
+N_RUNS = 1000
+MAX_STEPS = 100
+
+def link_distribution(counts, max_val):
+    """Normalized distribution of secondary infections among individuals who infected someone
+    
+    Args:
+        counts (np.ndarray): Histogram of secondary infections, counts[k] individuals infected k others
+        max_val (int): Largest number of links shown
+        
+    Returns:
+        np.ndarray: Density for 0..max_val links (0 links is always empty)
+    """
+    hist = np.zeros(max_val + 1)
+    shown = counts[1:max_val + 1]
+    hist[1:len(shown) + 1] = shown
+    return hist / hist.sum()
+
+
+def largest_links(counts):
+    """Largest number of secondary infections caused by one individual, 0 if none"""
+    nonzero = np.flatnonzero(counts)
+    return int(nonzero[-1]) if len(nonzero) else 0
+
+
+def secondary_infections_requests():
+    """
+    Simulations needed by the secondary infection figures.
+    
+    Returns:
+        list: (sim, scenario, observables) requests for λ=0.0 (Figure 12) and
+            Strong/Hub at λ=0.2 (Figure 13)
+    """
+    sim = SIRSimulation()
+    scenarios = [
+        Scenario(N, 0.0, 'strong_infectiousness', N_RUNS, MAX_STEPS),
+        Scenario(N, 0.2, 'strong_infectiousness', N_RUNS, MAX_STEPS),
+        Scenario(N, 0.2, 'hub', N_RUNS, MAX_STEPS),
+    ]
+    return [(sim, scenario, [SECONDARY_HISTOGRAM]) for scenario in scenarios]
+
+
+def render_secondary_infections(results):
     """
     Plot secondary infection distributions for different superspreader scenarios.
     
     This function generates histograms showing the distribution of secondary infections
     for scenarios with and without superspreaders.
-    """
-    sim = SIRSimulation()
-    N = 500
-    n_runs = 1000
-    max_steps = 100
     
+    Args:
+        results (list): Summaries of `secondary_infections_requests`, in order
+    """
+    import matplotlib.pyplot as plt
     os.makedirs("figures", exist_ok=True)
     
-    # Collect data
-    print("Collecting secondary infection data...")
-    
-    # Figure 12: λ=0.0 (No superspreaders)
-    all_secondary_no_super = []
-    for _ in tqdm(range(n_runs), desc='Secondary infections λ=0.0'):
-        result = sim.run_simulation(N, 0.0, 'strong_infectiousness', max_steps)
-        secondary = list(result['secondary_infections'].values())
-        all_secondary_no_super.extend(secondary)
-    
-    # Figure 13: λ=0.2 (With superspreaders)
-    all_secondary_strong = []
-    all_secondary_hub = []
-    
-    for _ in tqdm(range(n_runs), desc='Secondary infections λ=0.2'):
-        # Strong model
-        result = sim.run_simulation(N, 0.2, 'strong_infectiousness', max_steps)
-        secondary = list(result['secondary_infections'].values())
-        all_secondary_strong.extend(secondary)
-        
-        # Hub model
-        result = sim.run_simulation(N, 0.2, 'hub', max_steps)
-        secondary = list(result['secondary_infections'].values())
-        all_secondary_hub.extend(secondary)
+    counts_no_super, counts_strong, counts_hub = [result[SECONDARY_HISTOGRAM]['counts'] for result in results]
     
     # Set up matplotlib for better plots
     plt.rcParams['font.size'] = 12
@@ -55,9 +75,8 @@ def plot_secondary_infections():
     plt.figure(figsize=(8, 6))
     
     # Calculate histogram data
-    max_val = min(20, max(all_secondary_no_super)) if all_secondary_no_super else 20
-    bins = np.arange(0, max_val + 2) - 0.5  # Center bins on integers
-    hist_data, bin_edges = np.histogram(all_secondary_no_super, bins=bins, density=True)
+    max_val = min(20, largest_links(counts_no_super)) if largest_links(counts_no_super) else 20
+    hist_data = link_distribution(counts_no_super, max_val)
     
     # Create bar plot to match the reference style
     bin_centers = np.arange(0, max_val + 1)
@@ -83,12 +102,10 @@ def plot_secondary_infections():
     plt.figure(figsize=(8, 6))
     
     # Calculate histogram data for both models
-    max_val = min(20, max(max(all_secondary_strong) if all_secondary_strong else [0], 
-                         max(all_secondary_hub) if all_secondary_hub else [0]))
-    bins = np.arange(0, max_val + 2) - 0.5
+    max_val = min(20, max(largest_links(counts_strong), largest_links(counts_hub)))
     
-    hist_strong, _ = np.histogram(all_secondary_strong, bins=bins, density=True)
-    hist_hub, _ = np.histogram(all_secondary_hub, bins=bins, density=True)
+    hist_strong = link_distribution(counts_strong, max_val)
+    hist_hub = link_distribution(counts_hub, max_val)
     
     bin_centers = np.arange(0, max_val + 1)
     width = 0.35  # Width of bars for side-by-side plotting
@@ -119,5 +136,19 @@ def plot_secondary_infections():
     plt.savefig('figures/superspreaders_distribution.png', dpi=300, bbox_inches='tight')
     plt.close()
 
+
+def plot_secondary_infections(seed=0, n_workers=None, cache=True):
+    """
+    Simulate and plot secondary infection distributions for different superspreader scenarios.
+    
+    Args:
+        seed (int): Root seed of the Monte Carlo runs
+        n_workers (int): Number of worker processes, all cores if None
+        cache (bool): Reuse results from the on-disk result cache
+    """
+    print("Collecting secondary infection data...")
+    results = run_requests(secondary_infections_requests(), seed, n_workers, ResultCache() if cache else None)
+    render_secondary_infections(results)
+
 if __name__ == "__main__":
     plot_secondary_infections()
\ No newline at end of file
@@ -1,36 +1,262 @@
 import os 
 import sys
+import argparse
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
-from collections import defaultdict
-from scipy.interpolate import interp1d
-import random
-from models.SIR import SIRSimulation
+import glob
+import time
+import functools
+
+from models.cache import ResultCache
+from models.checkpoint import DEFAULT_CHECKPOINT_DIR, DEFAULT_INTERVAL, SweepCheckpoint
+from models.dataset import read_dataset, read_metadata, summaries_frame, summaries_from_frame, write_dataset
+from models.planner import SimulationPlan, sim_key
+from models.runner import normalize_scenario
+from models.sampling import AdaptiveSampling
+from models.instrumentation import Instrumentation
+from visualization.build import BuildState, Task, TaskReport, digest, print_summary, run_tasks
 from visualization.plot_infection_probabilities import plot_infection_probabilities
-from visualization.plot_percolation_probability import plot_percolation_probability
-from visualization.plot_critical_density import plot_critical_density
-from visualization.plot_distance_evolution import plot_distance_evolution
-from visualization.plot_propagation_velocity import plot_propagation_velocity
-from visualization.plot_epidemic_curves import plot_epidemic_curves
-from visualization.plot_secondary_infections import plot_secondary_infections
-from visualization.plot_sars_comparison import plot_sars_comparison
-
-
-os.makedirs("figures", exist_ok=True)
-
-def main():
-    plot_infection_probabilities()
-    plot_percolation_probability()
-    plot_critical_density()
-    plot_distance_evolution()
-    plot_propagation_velocity()
-    plot_epidemic_curves()
-    plot_secondary_infections()
-    plot_sars_comparison()
+from visualization.plot_percolation_probability import percolation_probability_requests, render_percolation_probability
+from visualization.plot_critical_density import critical_density_requests, render_critical_density, search_critical_densities, critical_density_frame, critical_density_from_frame
+from visualization.plot_distance_evolution import distance_evolution_requests, render_distance_evolution
+from visualization.plot_propagation_velocity import propagation_velocity_requests, render_propagation_velocity
+from visualization.plot_epidemic_curves import epidemic_curves_requests, render_epidemic_curves
+from visualization.plot_secondary_infections import secondary_infections_requests, render_secondary_infections
+from visualization.plot_sars_comparison import sars_comparison_requests, render_sars_comparison
+
+
+# Figure name -> (simulations it needs, renderer, files it writes)
+FIGURES = {
+    'percolation_probability': (percolation_probability_requests, render_percolation_probability,
+                                ('figures/strong_infectiousness_percolation.png', 'figures/hub_percolation.png')),
+    'critical_density': (critical_density_requests, render_critical_density, ('figures/critical_density.png',)),
+    'distance_evolution': (distance_evolution_requests, render_distance_evolution,
+                           ('figures/strong_distance_evolution.png',)),
+    'propagation_velocity': (propagation_velocity_requests, render_propagation_velocity,
+                             ('figures/propagation_velocity.png',)),
+    'epidemic_curves': (epidemic_curves_requests, render_epidemic_curves, ('figures/epidemic_curves.png',)),
+    'secondary_infections': (secondary_infections_requests, render_secondary_infections,
+                             ('figures/no_superspreaders_distribution.png', 'figures/superspreaders_distribution.png')),
+    'sars_comparison': (sars_comparison_requests, render_sars_comparison,
+                        ('figures/sars_secondary_cases.png', 'figures/sars_epidemic_curves.png')),
+}
+# Figures that need no simulation -> (function drawing them, files it writes)
+STATIC_FIGURES = {
+    'infection_probabilities': (plot_infection_probabilities,
+                                ('figures/strong_infection_prob.png', 'figures/hub_infection_prob.png')),
+}
+TARGETS = [*STATIC_FIGURES, *FIGURES]
+# Tidy table of the data of each simulated figure, which it can be re-rendered from
+DATASET_DIR = "datasets"
+# Code every simulated figure depends on
+MODEL_SOURCES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models", "*.py")))
+
+
+def sources(function):
+    """Code files a figure depends on: the module defining `function`, plus the model code"""
+    return (sys.modules[function.__module__].__file__, *MODEL_SOURCES)
+
+
+def dataset_path(name: str):
+    return os.path.join(DATASET_DIR, f"{name}.parquet")
+
+
+def simulate(plan: SimulationPlan, seed: int, n_workers: int, cache: bool, ci_width: float, engine: str,
+             profile: bool, checkpoint: SweepCheckpoint = None):
+    """Simulate every distinct scenario of the plan once, resuming from `checkpoint` if given
+
+    Returns:
+        tuple: ({figure name: summaries}, Instrumentation or None)
+    """
+    requested, unique = plan.volume()
+    print(f"Simulating at most {unique} runs ({requested} requested by the figures)")
+    # Percolation cells stop early once their probability is known to within ci_width
+    sampling = AdaptiveSampling(ci_width) if ci_width else None
+    instrumentation = Instrumentation() if profile else None
+    results = plan.run(seed, n_workers, ResultCache() if cache else None, sampling=sampling, engine=engine,
+                       instrumentation=instrumentation, checkpoint=checkpoint)
+    return results, instrumentation
+
+
+def render(name: str, metadata: dict, simulated):
+    """Store the dataset of figure `name` from the output of `simulate`, then render it"""
+    results, _ = simulated
+    requests = FIGURES[name][0]()
+    write_dataset(dataset_path(name), summaries_frame(requests, results[name]),
+                  {**metadata, 'figure': name, 'kind': 'summaries', 'created': time.strftime("%Y-%m-%dT%H:%M:%S")})
+    return FIGURES[name][1](results[name])
+
+
+def search_and_render_critical_density(seed: int, n_workers: int, cache: bool, engine: str, profile: bool,
+                                       metadata: dict):
+    """Locate the critical densities by sequential search, store their dataset and render them
+
+    Returns:
+        tuple: (None, Instrumentation or None), shaped like the output of `simulate`
+    """
+    instrumentation = Instrumentation() if profile else None
+    critical, errors = search_critical_densities(seed, n_workers, ResultCache() if cache else None, engine,
+                                                 instrumentation)
+    write_dataset(dataset_path('critical_density'), critical_density_frame(critical, errors),
+                  {**metadata, 'figure': 'critical_density', 'kind': 'search',
+                   'created': time.strftime("%Y-%m-%dT%H:%M:%S")})
+    render_critical_density(critical, errors)
+    return None, instrumentation
+
+
+def render_dataset(name: str):
+    """Render figure `name` from its stored dataset alone"""
+    path = dataset_path(name)
+    if read_metadata(path).get('kind') == 'search':
+        return render_critical_density(*critical_density_from_frame(read_dataset(path)))
+    requests = FIGURES[name][0]()
+    return FIGURES[name][1](summaries_from_frame(read_dataset(path), requests))
+
+
+def figure_tasks(targets, seed: int, n_workers: int, cache: bool, ci_width: float, critical_density: str,
+                 engine: str, profile: bool, checkpoint: SweepCheckpoint = None):
+    """Build tasks of the target figures
+
+    Simulated figures share one "simulations" task, so scenarios requested by
+    several of them are simulated once, and each renders once it is done. The
+    critical density search picks its scenarios as it goes, so it is a task
+    of its own, run alongside the others.
+
+    Returns:
+        tuple: (figure tasks, function building the simulation task of the
+            figure tasks kept)
+    """
+    options = (seed, engine, ci_width)
+    metadata = {'seed': seed, 'engine': engine, 'ci_width': ci_width}
+    tasks = []
+    for name in targets:
+        if name in STATIC_FIGURES:
+            function, outputs = STATIC_FIGURES[name]
+            tasks.append(Task(name, function, outputs=outputs, sources=sources(function), signature=digest(name)))
+            continue
+        requests, renderer, outputs = FIGURES[name]
+        if name == 'critical_density' and critical_density == 'search':
+            tasks.append(Task(name, functools.partial(search_and_render_critical_density, seed, n_workers, cache,
+                                                      engine, profile, metadata),
+                              outputs=(*outputs, dataset_path(name)), sources=sources(renderer),
+                              signature=digest((name, 'search', seed, engine))))
+            continue
+        declared = [(sim_key(sim), normalize_scenario(scenario), tuple(observables))
+                    for sim, scenario, observables in requests()]
+        tasks.append(Task(name, functools.partial(render, name, metadata), deps=('simulations',),
+                          outputs=(*outputs, dataset_path(name)), sources=sources(renderer),
+                          signature=digest((name, declared, options))))
+
+    def simulation_task(kept):
+        plan = SimulationPlan()
+        for task in kept:
+            if 'simulations' in task.deps:
+                plan.add(task.name, FIGURES[task.name][0]())
+        return Task('simulations', functools.partial(simulate, plan, seed, n_workers, cache, ci_width, engine,
+                                                     profile, checkpoint))
+
+    return tasks, simulation_task
+
+
+def render_only_tasks(targets):
+    """Tasks rendering the target figures from their datasets, without simulating"""
+    tasks = []
+    for name in targets:
+        if name in STATIC_FIGURES:
+            function, outputs = STATIC_FIGURES[name]
+            tasks.append(Task(name, function, outputs=outputs))
+        else:
+            tasks.append(Task(name, functools.partial(render_dataset, name), outputs=FIGURES[name][2]))
+    return tasks
+
+
+def main(seed=0, n_workers=None, cache=True, ci_width=0.05, critical_density='search', engine='ensemble', profile=None,
+         only=None, exclude=None, jobs=1, force=False, checkpoint_dir=DEFAULT_CHECKPOINT_DIR,
+         checkpoint_interval=DEFAULT_INTERVAL, render_only=False):
+    """Build the figures
+
+    Args:
+        only (list): Figures to build, all of TARGETS if None
+        exclude (list): Figures not to build
+        jobs (int): Tasks run at once, see `visualization.build.run_tasks`
+        force (bool): Rebuild figures that are up to date
+        checkpoint_dir (str): Where the simulations save their partial results,
+            and resume from those of an interrupted build; None disables it
+        checkpoint_interval (float): Seconds between checkpoint writes
+        render_only (bool): Re-render the figures from the datasets of a
+            previous build, without simulating
+
+    Returns:
+        dict: {task name: TaskReport}
+    """
+    os.makedirs("figures", exist_ok=True)
+    targets = [name for name in (only or TARGETS) if name not in (exclude or ())]
+    if render_only:
+        reports = run_tasks(render_only_tasks(targets), jobs)
+        print_summary(reports)
+        return reports
+
+    checkpoint = SweepCheckpoint(checkpoint_dir, checkpoint_interval) if checkpoint_dir else None
+    tasks, simulation_task = figure_tasks(targets, seed, n_workers, cache, ci_width, critical_density, engine,
+                                          bool(profile), checkpoint)
+
+    # Figures whose outputs are newer than their code and whose inputs did not change are skipped
+    state = BuildState()
+    fresh = [task for task in tasks if not force and state.up_to_date(task)]
+    stale = [task for task in tasks if task not in fresh]
+    if any(task.deps for task in stale):
+        stale.append(simulation_task(stale))
+
+    reports = run_tasks(stale, jobs)
+    for task in stale:
+        if reports[task.name].status == "built" and task.outputs:
+            state.record(task)
+    state.save()
+    reports.update((task.name, TaskReport(task.name, "up to date")) for task in fresh)
+    print_summary(reports)
+
+    if profile:
+        # Engine counters and phase timers of every simulated run
+        instrumentation = Instrumentation()
+        for report in reports.values():
+            if isinstance(report.value, tuple) and report.value[1] is not None:
+                instrumentation.merge(report.value[1])
+        instrumentation.write(profile)
+    return reports
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the figures, skipping those that are up to date")
+    parser.add_argument("--seed", type=int, default=0, help="Root seed of the Monte Carlo runs")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all cores)")
+    parser.add_argument("--no-cache", action="store_true", help="Simulate everything, ignoring cached results")
+    parser.add_argument("--clear-cache", action="store_true", help="Invalidate the result cache before running")
+    parser.add_argument("--ci-width", type=float, default=0.05,
+                        help="Target 95%% confidence interval width of percolation probabilities (0: fixed run count)")
+    parser.add_argument("--critical-density", choices=["search", "grid"], default="search",
+                        help="Locate critical densities by a sequential search or by interpolating a grid")
+    parser.add_argument("--engine", choices=["ensemble", "graph"], default="ensemble",
+                        help="Independent runs per scenario, or populations shared across superspreader fractions and models")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="Write engine counters and phase timers to PATH (Prometheus text format if it ends in .prom, JSON otherwise)")
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR,
+                        help="Directory the simulations periodically save partial results to and resume from")
+    parser.add_argument("--checkpoint-interval", type=float, default=DEFAULT_INTERVAL,
+                        help="Seconds between checkpoint writes (default: %(default)s)")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Do not save or resume partial results")
+    parser.add_argument("--render-only", action="store_true",
+                        help=f"Re-render the figures from the datasets in {DATASET_DIR}/ of a previous build, without simulating")
+    parser.add_argument("--only", nargs="+", choices=TARGETS, default=None, metavar="FIGURE",
+                        help=f"Figures to build (default: all of {', '.join(TARGETS)})")
+    parser.add_argument("--exclude", nargs="+", choices=TARGETS, default=None, metavar="FIGURE",
+                        help="Figures not to build")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Build tasks run concurrently, each in its own process (default: 1)")
+    parser.add_argument("--force", action="store_true", help="Rebuild figures even if they are up to date")
+    args = parser.parse_args()
+    if args.clear_cache:
+        ResultCache().clear()
+    reports = main(args.seed, args.workers, not args.no_cache, args.ci_width, args.critical_density, args.engine,
+                   args.profile, args.only, args.exclude, args.jobs, args.force,
+                   None if args.no_checkpoint else args.checkpoint_dir, args.checkpoint_interval, args.render_only)
+    sys.exit(any(report.status in ("failed", "skipped") for report in reports.values()))
\ No newline at end of file